@@ -1,8 +1,12 @@
 import streamlit as st
 import requests
+from requests_toolbelt import MultipartEncoder
 import os
+import time
+import json
 from typing import List
 from config import settings
+from rag.prompts import fallback_answer
 from utils.logger import get_logger
 
 logger = get_logger("streamlit_app")
@@ -29,31 +33,34 @@ uploaded_files = st.file_uploader(
 
 if uploaded_files:
     if st.button("Reindex Now"):
-        saved_paths = []
-        for file in uploaded_files:
-            save_path = os.path.join(settings.DEFAULT_DOCS_PATH, file.name)
-            saved_paths.append(save_path)
-            with open(save_path, "wb") as f:
-                f.write(file.getbuffer())
-
-        logger.info(f"Uploaded {len(uploaded_files)} file(s). Re-indexing the DB...")
+        # The API stores the files in docs/ (the corpus of record) and indexes
+        # only them; removing a file there drops its chunks on the next reindex
+        upload_url = settings.AI_RAG_API_URL + "documents"
+        # Streams the body part by part; requests' files= would build it in memory first
+        encoder = MultipartEncoder(
+            fields=[("files", (file.name, file, file.type or "application/octet-stream")) for file in uploaded_files]
+        )
+        response = requests.post(upload_url, data=encoder, headers={"Content-Type": encoder.content_type})
+        if response.status_code != 202:
+            st.error(f"Upload failed {response.status_code}: {response.text}")
+            st.stop()
+
+        job = response.json()
+        logger.info(f"Uploaded {len(uploaded_files)} file(s). Db re-index job ==> {job}")
         st.success(f"Uploaded {len(uploaded_files)} file(s). Re-indexing the DB...")
-        reindex_url = settings.AI_RAG_API_URL + "reindex"
-        response = requests.post(reindex_url)
-        logger.info(f"Db re-index response ==> {response.json()}")
-        st.info(f"{response.json()}")
-
-        for path in saved_paths:
-            try:
-                os.remove(path)
-                logger.info(f"Deleted file after reindex: {path}")
-            except Exception as e:
-                logger.error(f"Failed to delete {path}: {e}")
-        
+
+        # Reindex runs in the background; wait for it to finish
+        job_url = settings.AI_RAG_API_URL + f"jobs/{job['job_id']}"
+        with st.spinner("Re-indexing in the background..."):
+            while job["status"] in ("pending", "running"):
+                time.sleep(1)
+                job = requests.get(job_url).json()
+        logger.info(f"Db re-index response ==> {job}")
+        st.info(f"{job}")
+
         # Clear Metrics
         metrics_url = settings.AI_RAG_API_URL + "reset_metrics"
         requests.post(metrics_url)
-        st.success("Files cleared from local storage after reindex.")
 
 # ---------------------------
 # 2. Ask a Question
@@ -66,34 +73,46 @@ if st.button("Submit Query"):
     if not user_query.strip():
         st.warning("Please enter a question.")
     else:
-        with st.spinner("Getting answer from RAG..."):
-            try:
-                query_url = settings.AI_RAG_API_URL + "query"
-                payload = {"question": user_query}
-                response = requests.post(query_url, json=payload)
+        try:
+            # Stream the answer: tokens render as they arrive instead of after full generation
+            query_url = settings.AI_RAG_API_URL + "query/stream?format=ndjson"
+            payload = {"question": user_query}
 
+            with requests.post(query_url, json=payload, stream=True) as response:
                 if response.status_code != 200:
                     st.error(f"Error {response.status_code}: {response.text}")
                 else:
-                    data = response.json()
-
-                    # Display answer
                     st.subheader("💡 Answer")
-                    st.write(data["answer"])
+                    answer_box = st.empty()
+                    answer, sources, usage = "", [], {}
+
+                    with st.spinner("Getting answer from RAG..."):
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            message = json.loads(line)
+                            if message["event"] == "sources":
+                                sources = message["data"]
+                            elif message["event"] == "token":
+                                answer += message["data"]
+                                answer_box.markdown(answer + "▌")
+                            elif message["event"] == "usage":
+                                usage = message["data"]
+                    answer_box.markdown(answer)
 
                     # Display sources
-                    if data["sources"]:
+                    if sources and answer != fallback_answer:
                         st.subheader("📄 Source Documents")
-                        for src in data["sources"]:
+                        for src in sources:
                             st.write(f"• **{src['source']}** (Page: {src['page']})")
                     else:
                         st.info("No source documents used.")
-                    
+
                     # Display total tokens
                     st.subheader("📊 Usage")
-                    st.write(f"Total Tokens: {data['total_tokens']}")
-            except Exception as e:
-                st.error(f"Error connecting to backend: {e}")
+                    st.write(f"Total Tokens: {usage.get('total_tokens', 0)}")
+        except Exception as e:
+            st.error(f"Error connecting to backend: {e}")
 
 # ---------------------------
 # 3. Metrics Section
@@ -127,6 +146,12 @@ if st.button("Get Metrics"):
                 st.subheader("LLM Metrics")
                 st.json(metrics_data.get("llm", {}))
 
+                st.subheader("Streaming Metrics (time to first token / between tokens)")
+                st.json({
+                    "ttft": metrics_data.get("ttft", {}),
+                    "inter_token": metrics_data.get("inter_token", {})
+                })
+
                 st.subheader("Total Pipeline Metrics")
                 st.json(metrics_data.get("total", {}))
 
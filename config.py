@@ -15,20 +15,95 @@ class Settings(BaseSettings):
     DEFAULT_CHROMA_PATH: str = "vector_store/chroma_db"
     DEFAULT_LOGLEVEL: str = "INFO"
 
-    GOOGLE_API_KEY: str
+    # Only needed by the "google" providers
+    GOOGLE_API_KEY: Optional[str] = None
 
     # Vector Store Configurations
+    # google | hashing (offline). Vectors differ in size: give each provider its own DEFAULT_CHROMA_PATH
+    EMBEDDING_PROVIDER: str = "google"
     EMBEDDING_MODEL: str = "models/text-embedding-004"
+    LOCAL_EMBEDDING_DIM: int = 1024
+    LOCAL_EMBEDDING_LATENCY_MS: float = 0.0
     VECTOR_STORE_K: int = 20
+    EMBEDDING_QUERY_CACHE_SIZE: int = 2048
+    EMBEDDING_QUERY_CACHE_SPILL_PATH: Optional[str] = None
+    EMBEDDING_STORE_PATH: Optional[str] = "vector_store/embedding_cache/embeddings.sqlite"
 
     # LLM Configurations
+    LLM_PROVIDER: str = "google"  # google | fake (offline)
     LLM_MODEL: str = "gemini-2.0-flash"
     LLM_TEMPERATURE: float = 0.1
+    FAKE_LLM_TTFT_MS: float = 400.0
+    FAKE_LLM_TTFT_SIGMA: float = 0.3
+    FAKE_LLM_TOKENS_PER_SECOND: float = 80.0
+    FAKE_LLM_TOKEN_SIGMA: float = 0.2
+    FAKE_LLM_OUTPUT_TOKENS: int = 80
+    FAKE_LLM_SEED: int = 0
+
+    # Context Packing Configurations
+    CONTEXT_PACKING_ENABLED: bool = True
+    CONTEXT_TOKEN_BUDGET: int = 2000  # estimated tokens of context per prompt, 0 = unlimited
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.8  # share of shingles already in a better passage
+    CONTEXT_MAX_OVERLAP_CHARS: int = 200  # longest repeated text stripped between adjacent chunks
 
     # Reranker Configurations
     RERANKER_MODEL: str = "ce-esci-MiniLM-L12-v2"
     RERANKER_TOP_N: int = 5
     RERANKER_TYPE: str = "flashrank"
+    RERANK_MAX_BATCH_PAIRS: int = 128  # query-passage pairs scored per model call
+    RERANK_MAX_WAIT_MS: float = 5.0
+    RERANK_CASCADE_ENABLED: bool = True
+    RERANK_SKIP_MARGIN: float = 0.2       # top-1 vs top-2 relevance gap that skips the rerank
+    RERANK_SHRINK_MARGIN: float = 0.3     # candidates further below the best are dropped
+    RERANK_MIN_CANDIDATES: int = 10
+    RERANK_PREFILTER_K: int = 15          # 0 disables the lexical pre-filter
+    RERANK_PAIR_COST_MS: float = 2.0      # initial per-pair cost estimate for the budget
+    RERANK_LATENCY_BUDGET_MS: Optional[float] = None  # default retrieval + rerank budget
+
+    # Ingestion Configurations
+    INGEST_WORKERS: int = 0  # 0 = parse in the API process
+    INGEST_PDF_PAGES_PER_TASK: int = 50
+    INGEST_WORKER_NICE: int = 10
+    HASH_WORKERS: int = 8
+    BOILERPLATE_MIN_PAGES: int = 3
+    BOILERPLATE_PAGE_RATIO: float = 0.5
+    BOILERPLATE_EDGE_LINES: int = 3
+    EMBED_BATCH_SIZE: int = 100
+    EMBED_CONCURRENCY: int = 4
+    EMBED_REQUESTS_PER_MINUTE: int = 1500
+    EMBED_MAX_RETRIES: int = 5
+    EMBED_RETRY_BACKOFF_SECONDS: float = 1.0
+
+    UPLOAD_MAX_BYTES: int = 200 * 1024 * 1024  # per file
+    UPLOAD_MAX_REQUEST_BYTES: int = 1024 * 1024 * 1024  # whole multipart body
+
+    # Docs Watcher Configurations
+    WATCH_DOCS: bool = False
+    WATCH_USE_POLLING: bool = False  # force polling (e.g. bind mounts without inotify)
+    WATCH_DEBOUNCE_SECONDS: float = 2.0
+    WATCH_MAX_BATCH_DELAY: float = 30.0
+    WATCH_POLL_INTERVAL: float = 5.0
+    WATCH_MAX_RETRIES: int = 5  # failed batches before a file is dropped until its next change
+    WATCH_RETRY_BACKOFF_SECONDS: float = 5.0  # doubles per failure
+    WATCH_MAX_RETRY_BACKOFF_SECONDS: float = 300.0
+
+    # Concurrency Configurations
+    EXECUTOR_MAX_WORKERS: int = 8
+
+    # Share one execution between identical in-flight questions
+    QUERY_COALESCING_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = True  # per-stage Server-Timing header on /query
+
+    # Metrics Configurations
+    METRICS_MULTIPROC_DIR: Optional[str] = None  # shared snapshot dir when running several workers
+    METRICS_FLUSH_INTERVAL: float = 5.0
+
+    # Answer Cache Configurations
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
 
     # Streamlit Configurations
     AI_RAG_API_URL: str = "http://ai-rag-api:5050/"
@@ -37,4 +112,5 @@ class Settings(BaseSettings):
     model_config  = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
 settings = Settings()
-os.environ["GOOGLE_API_KEY"] = settings.GOOGLE_API_KEY
\ No newline at end of file
+if settings.GOOGLE_API_KEY:
+    os.environ["GOOGLE_API_KEY"] = settings.GOOGLE_API_KEY
\ No newline at end of file
@@ -1,13 +1,22 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 
 from service.assistant import AssistantService
+from service.jobs import JobManager
+from service.uploads import (
+    UPLOAD_FIELD, UploadError, UploadTooLarge, commit_uploads, discard_uploads, receive_uploads
+)
+from vector_store.chroma_manager import SUPPORTED_EXTENSIONS
 from config import settings
 from utils.logger import get_logger
+from utils.tracing import start_trace
 
 from utils.performance_calc import Metrics
+import json
 import time
 
 from test.concurrency_test import run_test
@@ -21,13 +30,64 @@ assistant = AssistantService(
     chroma_path=settings.DEFAULT_CHROMA_PATH
 )
 
-# Initialize the RAG components
-assistant.initialize()
+# Background jobs (reindexing)
+jobs = JobManager()
+
+# Optional near-real-time indexing of the docs directory, started with the app
+watcher = None
+
+def index_changed_files(filenames):
+    # Same job queue as /reindex, so watcher batches never interleave with it
+    job = jobs.submit("watch_reindex", assistant.reindex, filenames=filenames)
+    job.wait()
+    if job.status == "failed":
+        raise RuntimeError(job.error)
+
+@asynccontextmanager
+async def lifespan(app):
+    """Startup/shutdown work. Kept out of import time so that processes that
+    import this module (e.g. spawned ingestion workers) stay side-effect free."""
+    global watcher
+
+    # Share this worker's metrics with the others (METRICS_MULTIPROC_DIR)
+    metrics.start_flusher()
+
+    # Initialize the RAG components
+    assistant.initialize()
+
+    if settings.WATCH_DOCS:
+        from vector_store.watcher import DocsWatcher
+
+        # Catch up on changes made while the service was down
+        jobs.submit("reindex", assistant.reindex)
+
+        watcher = DocsWatcher(
+            settings.DEFAULT_DOCS_PATH,
+            SUPPORTED_EXTENSIONS,
+            on_batch=index_changed_files,
+            debounce_seconds=settings.WATCH_DEBOUNCE_SECONDS,
+            max_batch_delay=settings.WATCH_MAX_BATCH_DELAY,
+            poll_interval=settings.WATCH_POLL_INTERVAL,
+            use_polling=settings.WATCH_USE_POLLING,
+            max_retries=settings.WATCH_MAX_RETRIES,
+            retry_backoff=settings.WATCH_RETRY_BACKOFF_SECONDS,
+            max_retry_backoff=settings.WATCH_MAX_RETRY_BACKOFF_SECONDS
+        )
+        watcher.start()
+
+    yield
+
+    if watcher:
+        watcher.stop()
 
 # Pydantic Models for API Contract
 class QueryInput(BaseModel):
     """Schema for the incoming user query."""
     question: str
+    # Optional retrieval + rerank budget; past it the reranker is skipped
+    latency_budget_ms: Optional[float] = None
+    # Return the per-stage timing breakdown (ms) in the response body
+    include_timings: bool = False
 
 class SourceDocument(BaseModel):
     """Schema for a retrieved source document."""
@@ -39,33 +99,77 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[SourceDocument]
     total_tokens: int
+    timings: Optional[Dict[str, float]] = None
 
 # FastAPI Application Instance
 app = FastAPI(
     title=settings.app_name,
     description=settings.app_description,
-    version=settings.app_version
+    version=settings.app_version,
+    lifespan=lifespan
 )
 
 # 3. API Endpoints
-@app.post("/query", response_model=QueryResponse)
-async def handle_query(input: QueryInput):
+@app.post("/query", response_model=QueryResponse, response_model_exclude_none=True)
+async def handle_query(input: QueryInput, response: Response):
     """
     Accepts a user question, performs RAG using the internal knowledge base, 
-    and returns a grounded answer.
+    and returns a grounded answer. Per-stage timings of this request are sent
+    in the `Server-Timing` header (and in the body with `include_timings`).
     """
     try:
         t0 = time.time()
+        trace = start_trace()
         # Call the core RAG service function
-        result = await assistant.query(input.question)
+        result = await assistant.query(input.question, input.latency_budget_ms)
         ms = (time.time() - t0) * 1000
         metrics.total.record(ms)
+
+        if settings.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = trace.server_timing()
+        if input.include_timings:
+            # Copy: the result may be the answer cache's own dict
+            result = {**result, "timings": trace.timings()}
         # FastAPI handles serializing the dict to the Pydantic response model
         return result
     except Exception as err:
         # Handle cases where the RAG chain failed to initialize or execute
+        metrics.errors.incr("api")
         raise HTTPException(status_code=500, detail=str(err))
 
+@app.post("/query/stream")
+async def handle_query_stream(input: QueryInput, format: str = "sse"):
+    """
+    Streams the answer as it is generated: a `sources` event, then one
+    `token` event per LLM chunk, then a `usage` event. `format=sse` sends
+    Server-Sent Events, `format=ndjson` one JSON object per line.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    if assistant.chain is None:
+        raise HTTPException(status_code=500, detail="RAG not initialized")
+
+    async def events():
+        t0 = time.time()
+        trace = start_trace()
+        async for event, data in assistant.astream_query(input.question, input.latency_budget_ms):
+            if event == "usage" and input.include_timings:
+                # Headers are gone by now; the breakdown rides on the last event
+                data = {**data, "timings": trace.timings()}
+            if format == "sse":
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            else:
+                yield json.dumps({"event": event, "data": data}) + "\n"
+        metrics.total.record((time.time() - t0) * 1000)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # no-transform / X-Accel-Buffering: keep proxies from buffering the stream
+    return StreamingResponse(
+        events(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/health")
 def health_check():
     return {
@@ -73,21 +177,88 @@ def health_check():
         "assistant_ready": assistant.chain is not None
     }
 
-@app.post("/reindex")
-async def reindex():
+@app.post("/reindex", status_code=202)
+def reindex():
+    """Queue a background reindex. Poll /jobs/{job_id} for progress."""
+    job = jobs.submit("reindex", assistant.reindex)
+    return job.to_dict()
+
+# The body is parsed by hand (see receive_uploads), so describe it for the docs
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [UPLOAD_FIELD],
+                    "properties": {
+                        UPLOAD_FIELD: {"type": "array", "items": {"type": "string", "format": "binary"}}
+                    },
+                }
+            }
+        },
+    }
+}
+
+@app.post("/documents", status_code=202, openapi_extra=_UPLOAD_BODY)
+async def upload_documents(request: Request):
+    """
+    Stream uploaded files into the docs directory (parsing the multipart
+    body and hashing each file as it arrives) and queue a job that indexes
+    only those files. Poll /jobs/{job_id}.
+    All files are accepted or none: nothing lands in the docs directory
+    unless every file was written successfully.
+    """
     try:
-        result = await assistant.reindex()
-        assistant.initialize()
-        return result
-    except Exception as err:
-        # Failed to update DB
-        logger.error(f"Error @ reindex | Error ==> {err}")
-        raise HTTPException(status_code=500, detail=str(err))
+        staged = await receive_uploads(
+            request,
+            settings.DEFAULT_DOCS_PATH,
+            SUPPORTED_EXTENSIONS,
+            settings.UPLOAD_MAX_BYTES,
+            settings.UPLOAD_MAX_REQUEST_BYTES
+        )
+    except UploadTooLarge as err:
+        raise HTTPException(status_code=413, detail=str(err))
+    except UploadError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+
+    try:
+        known = commit_uploads(staged)
+    except BaseException:
+        discard_uploads(staged)
+        raise
+
+    job = jobs.submit("upload", assistant.reindex, filenames=sorted(known), known=known)
+    return {**job.to_dict(), "files": sorted(known)}
+
+@app.get("/jobs")
+def list_jobs():
+    return jobs.list()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+@app.get("/watcher")
+def watcher_status():
+    """Docs watcher backlog (pending files, oldest event age, batch in flight)."""
+    if watcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **watcher.status()}
 
 @app.get("/metrics")
 def get_metrics():
     return metrics.stats()
 
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    """Same metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/reset_metrics")
 def reset_metrics():
     metrics.reset_all()
@@ -0,0 +1,82 @@
+import hashlib
+import re
+
+_DIGITS = re.compile(r"\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Running headers/footers are short. Longer edge lines keep their digits so
+# templated body sentences ("Section 3.1: revenue grew by 12%...") survive.
+_MAX_MASKED_WORDS = 8
+
+class BoilerplateDetector:
+    """Document-level running header/footer detection.
+
+    `clean_text` only sees one page at a time, so it cannot spot a header that
+    repeats once per page. This detector fingerprints the lines of every page
+    of a file and flags the ones that occur on many pages:
+
+    - The first/last `edge_lines` lines of a page are fingerprinted with their
+      position, and short ones with digits masked, so "Page 3 of 40" at the
+      bottom of page 3 matches "Page 4 of 40" at the bottom of page 4.
+    - Other lines are fingerprinted by their exact (whitespace-normalized) text.
+
+    A fingerprint is boilerplate when it appears on at least `min_pages` pages
+    and on more than `page_ratio` of all pages. Both passes are linear in the
+    number of lines, and fingerprints are stable across processes.
+    """
+
+    def __init__(self, min_pages=3, page_ratio=0.5, edge_lines=3):
+        self.min_pages = min_pages
+        self.page_ratio = page_ratio
+        self.edge_lines = edge_lines
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+    def fingerprints(self, page_text: str):
+        """Return one fingerprint per line of `page_text` (None for blank lines)."""
+        lines = page_text.split("\n")
+        positions = [i for i, line in enumerate(lines) if line.strip()]
+        n = len(positions)
+
+        keys = [None] * len(lines)
+        for rank, i in enumerate(positions):
+            text = _WHITESPACE.sub(" ", lines[i].strip()).lower()
+            if rank < self.edge_lines:
+                position = f"top{rank}"
+            elif n - rank <= self.edge_lines:
+                position = f"bottom{n - rank - 1}"
+            else:
+                keys[i] = ("body", self._digest(text))
+                continue
+
+            if text.count(" ") < _MAX_MASKED_WORDS:
+                text = _DIGITS.sub("#", text)
+            keys[i] = (position, self._digest(text))
+        return keys
+
+    def fit(self, pages):
+        """Return the set of boilerplate fingerprints for a file's page texts."""
+        page_counts = {}
+        total = 0
+        for page_text in pages:
+            total += 1
+            for key in set(self.fingerprints(page_text)):
+                if key is not None:
+                    page_counts[key] = page_counts.get(key, 0) + 1
+
+        if total < self.min_pages:
+            return set()
+
+        threshold = max(self.min_pages, int(total * self.page_ratio) + 1)
+        return {key for key, count in page_counts.items() if count >= threshold}
+
+    def strip(self, page_text: str, boilerplate) -> str:
+        """Remove boilerplate lines from one page, keeping the line structure."""
+        if not boilerplate:
+            return page_text
+
+        lines = page_text.split("\n")
+        keys = self.fingerprints(page_text)
+        return "\n".join(line for line, key in zip(lines, keys) if key not in boilerplate)
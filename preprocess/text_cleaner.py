@@ -1,6 +1,40 @@
 import re
 from collections import Counter
 
+# ------------------------------
+# Precompiled line classifiers
+# ------------------------------
+# Separator rules (___, ---, ===, |||) and obvious page numbers ("Page 3 of 10",
+# "Page 3", "3/10", "- 3 -", "3") must match the whole line, so they are folded
+# into one anchored alternation.
+_RULE_OR_PAGE_NUMBER = re.compile(
+    r"[_\-=]{3,}"
+    r"|[|]{3,}"
+    r"|page\s*\d+\s*of\s*\d+"
+    r"|page\s*\d+"
+    r"|\d+\s*/\s*\d+"
+    r"|-\s*\d+\s*-"
+    r"|\d+",
+    flags=re.IGNORECASE
+)
+
+# Watermark/footer phrases may appear anywhere in the line.
+_FOOTER_PHRASES = (
+    "confidential",
+    "all rights reserved",
+    "internal use only",
+    "do not distribute",
+    "printed on",
+    "copyright",
+    "company name",
+)
+
+# Case-insensitive matching of non-ASCII text has a few extra equivalences
+# (e.g. "\u017f" ~ "s") that str.lower() does not reproduce, so only those
+# lines go through the regex; ASCII lines use plain substring checks.
+_FOOTER = re.compile("|".join(map(re.escape, _FOOTER_PHRASES)), flags=re.IGNORECASE)
+
+
 def clean_text(text: str) -> str:
     """Clean text extracted from PDF/DOCX/TXT by removing boilerplate,
     headers, footers, page numbers, repeated lines, and formatting noise.
@@ -14,68 +48,35 @@ def clean_text(text: str) -> str:
     text = text.replace("\ufeff", "")     # BOM
 
     # ------------------------------
-    # 2. Split into lines
-    # ------------------------------
-    lines = [line.strip() for line in text.split("\n")]
-
-    # ------------------------------
-    # 3. Remove empty or noisy lines
-    # ------------------------------
-    def is_noise(line):
-        return (
-            len(line) <= 1 or
-            re.fullmatch(r"[_\-=]{3,}", line) is not None or
-            re.fullmatch(r"[|]{3,}", line) is not None
-        )
-
-    lines = [line for line in lines if not is_noise(line)]
-
-    # ------------------------------
-    # 4. Remove obvious page numbers
+    # 2. Split + classify every line in a single pass:
+    #     empty/noisy lines, page numbers, watermark/footer patterns
     # ------------------------------
-    page_num_patterns = [
-        r"^page\s*\d+\s*of\s*\d+$",
-        r"^page\s*\d+$",
-        r"^\d+\s*/\s*\d+$",
-        r"^-\s*\d+\s*-$",
-        r"^\d+$",
-    ]
-
-    def is_page_number(line):
-        return any(re.match(p, line, flags=re.IGNORECASE) for p in page_num_patterns)
+    is_rule_or_page_number = _RULE_OR_PAGE_NUMBER.fullmatch
+    lines = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if len(line) <= 1 or is_rule_or_page_number(line):
+            continue
 
-    lines = [line for line in lines if not is_page_number(line)]
+        if line.isascii():
+            lowered = line.lower()
+            for phrase in _FOOTER_PHRASES:
+                if phrase in lowered:
+                    break
+            else:
+                lines.append(line)
+        elif _FOOTER.search(line) is None:
+            lines.append(line)
 
     # ------------------------------
-    # 5. Remove watermark/footer patterns
-    # ------------------------------
-    footer_patterns = [
-        r"confidential",
-        r"all rights reserved",
-        r"internal use only",
-        r"do not distribute",
-        r"printed on.*",
-        r"copyright.*",
-        r"company name.*",
-    ]
-
-    def is_footer(line):
-        return any(re.search(p, line, flags=re.IGNORECASE) for p in footer_patterns)
-
-    lines = [line for line in lines if not is_footer(line)]
-
-    # ------------------------------
-    # 6. Detect repeated boilerplate (headers/footers)
+    # 3. Detect repeated boilerplate (headers/footers)
     #     Lines appearing in > 20% of pages are removed.
     # ------------------------------
     counts = Counter(lines)
     threshold = max(3, int(len(lines) * 0.20))
 
-    lines = [line for line in lines if counts[line] < threshold]
-
     # ------------------------------
-    # 7. Final whitespace normalization
+    # 4. Final whitespace normalization
+    #     (str.split() splits on exactly the characters matched by \s)
     # ------------------------------
-    text = " ".join(lines)          # collapse lines
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    return " ".join(" ".join(line for line in lines if counts[line] < threshold).split())
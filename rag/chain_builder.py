@@ -1,9 +1,10 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel, RunnableLambda
+from langchain_core.runnables import RunnableParallel, RunnableLambda
 from .prompts import SYSTEM_PROMPT, fallback_answer
+from .llm_providers import create_llm
+from .context_packer import ContextPacker
 from utils.performance_calc import Metrics
-import time
+from utils.tracing import span
 from config import settings
 
 metrics = Metrics()
@@ -13,67 +14,87 @@ class TimedLLM:
         self.llm = llm
 
     def invoke(self, input):
-        t0 = time.time()
-        out = self.llm.invoke(input)
-        ms = (time.time() - t0) * 1000
-        metrics.llm.record(ms)
-        return out
+        with span("llm", metrics.llm):
+            return self.llm.invoke(input)
+
+    async def ainvoke(self, input):
+        with span("llm", metrics.llm):
+            return await self.llm.ainvoke(input)
+
+    async def astream(self, input):
+        with span("llm", metrics.llm):
+            async for chunk in self.llm.astream(input):
+                yield chunk
 
 class RAGChainBuilder:
     def __init__(self, retriever):
         self.retriever = retriever
+        self.packer = ContextPacker() if settings.CONTEXT_PACKING_ENABLED else None
+        self.chain = None
 
+    # Embedding, search and rerank time themselves (see utils.tracing)
     def timed_retriever(self, input):
-        t0 = time.time()
-        docs = self.retriever.invoke(input)
+        return self.retriever.invoke(input["input"], input.get("embedding"), input.get("deadline"))
 
-        total_ms = (time.time() - t0) * 1000   # embed + search
-        chroma_ms = total_ms
+    async def atimed_retriever(self, input):
+        return await self.retriever.ainvoke(input["input"], input.get("embedding"), input.get("deadline"))
 
-        if metrics.embedding.values:  
-            last_embed_ms = metrics.embedding.values[-1]
-            chroma_ms -= last_embed_ms
-        if metrics.rerank.values:
-            last_rerank_ms = metrics.rerank.values[-1]
-            chroma_ms -= last_rerank_ms
+    def _docs_to_context(self, data):
+        docs = data["retrieved_docs"]
+        if self.packer:
+            # Only the passages that made it into the prompt are reported as sources
+            docs = self.packer.pack(docs)
+        context_text = "\n\n".join(doc.page_content for doc in docs)
 
-        metrics.retrieval.record(chroma_ms)
-        return docs
+        return {
+            "context": context_text,
+            "input": data["input"],
+            "retrieved_docs": docs
+        }
 
     def build(self):
-        raw_llm  = ChatGoogleGenerativeAI(model=settings.LLM_MODEL, temperature=settings.LLM_TEMPERATURE)
+        raw_llm  = create_llm()
         timed_llm = TimedLLM(raw_llm)
-        llm_runnable = RunnableLambda(lambda x: timed_llm.invoke(x))
+        llm_runnable = RunnableLambda(lambda x: timed_llm.invoke(x), afunc=timed_llm.ainvoke)
 
         prompt = ChatPromptTemplate.from_messages(
             [("system", SYSTEM_PROMPT),
              ("human", "{input}")]
         )
 
-        timed_retriever_runnable = RunnableLambda(lambda x: self.timed_retriever(x))
+        timed_retriever_runnable = RunnableLambda(
+            lambda x: self.timed_retriever(x),
+            afunc=self.atimed_retriever
+        )
 
         retrieve = RunnableParallel(
             retrieved_docs=timed_retriever_runnable,
-            input=RunnablePassthrough()
+            input=lambda x: x["input"]
         )
 
-        def docs_to_context(data):
-            docs = data["retrieved_docs"]
-            context_text = "\n\n".join(doc.page_content for doc in docs)
-
-            return {
-                "context": context_text,
-                "input": data["input"],
-                "retrieved_docs": docs
-            }
-
         rag_chain = (
             retrieve
-            | docs_to_context
+            | self._docs_to_context
             | {
                 "response": prompt | llm_runnable,
                 "retrieved_docs": lambda x: x["retrieved_docs"],
             }
         )
 
+        # Kept for astream, which runs the same steps but streams the LLM output
+        self.retrieve = retrieve
+        self.prompt = prompt
+        self.timed_llm = timed_llm
+        self.chain = rag_chain
+
         return rag_chain
+
+    async def astream(self, input):
+        """Same pipeline as the chain, streamed. Yields ("retrieved_docs", docs)
+        once retrieval is done, then ("chunk", AIMessageChunk) per LLM chunk."""
+        data = self._docs_to_context(await self.retrieve.ainvoke(input))
+        yield "retrieved_docs", data["retrieved_docs"]
+
+        messages = await self.prompt.ainvoke(data)
+        async for chunk in self.timed_llm.astream(messages):
+            yield "chunk", chunk
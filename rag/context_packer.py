@@ -0,0 +1,138 @@
+import re
+
+from langchain_core.documents import Document
+
+from utils.performance_calc import Metrics
+from config import settings
+
+metrics = Metrics()
+
+_WORD = re.compile(r"\w+")
+# Shorter suffix/prefix matches are likely coincidental
+_MIN_OVERLAP_CHARS = 20
+
+def estimate_tokens(text: str) -> int:
+    """Rough local token count (~4 chars per token), no tokenizer download needed."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _shingles(text: str, size=3):
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _containment(a, b) -> float:
+    """Share of `a`'s shingles that also occur in `b`."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a)
+
+
+class ContextPacker:
+    """Assemble the LLM context from reranked chunks (best first).
+
+    1. Chunks of the same document page with consecutive `chunk_index` are
+       merged into one passage, dropping the text the splitter repeated
+       between them (`chunk_overlap`).
+    2. Passages are ordered by their best chunk's rank.
+    3. A passage whose word shingles mostly (`duplicate_threshold`) occur in
+       a better-ranked passage is dropped, e.g. the same text indexed from
+       two files, or a chunk already inside a merged passage.
+    4. Passages are added while they fit in `token_budget` (estimated
+       tokens; the best passage is truncated rather than dropped).
+
+    Every step taken is counted in `metrics.context_pack`, and raw vs
+    packed token estimates in `metrics.context_tokens`.
+    """
+
+    def __init__(
+        self,
+        token_budget=settings.CONTEXT_TOKEN_BUDGET,
+        duplicate_threshold=settings.CONTEXT_DUPLICATE_THRESHOLD,
+        max_overlap_chars=settings.CONTEXT_MAX_OVERLAP_CHARS
+    ):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self.max_overlap_chars = max_overlap_chars
+
+    def _join(self, head: str, tail: str) -> str:
+        for size in range(min(len(head), len(tail), self.max_overlap_chars), _MIN_OVERLAP_CHARS - 1, -1):
+            if head.endswith(tail[:size]):
+                metrics.context_pack.incr("overlap_stripped")
+                return head + tail[size:]
+        return head + "\n" + tail
+
+    def _passages(self, docs):
+        """Return [(rank, [chunks])], merging runs of adjacent chunks."""
+        runs = {}
+        passages = []
+        for rank, doc in enumerate(docs):
+            meta = doc.metadata
+            if meta.get("chunk_index") is None or meta.get("document_id") is None:
+                passages.append((rank, [doc]))
+                continue
+            runs.setdefault((meta["document_id"], meta.get("page")), []).append((meta["chunk_index"], rank, doc))
+
+        for chunks in runs.values():
+            chunks.sort(key=lambda c: c[0])
+            run = [chunks[0]]
+            for chunk in chunks[1:]:
+                if chunk[0] == run[-1][0]:
+                    # Same chunk retrieved twice
+                    continue
+                if chunk[0] == run[-1][0] + 1:
+                    run.append(chunk)
+                    metrics.context_pack.incr("merged")
+                    continue
+                passages.append((min(r for _, r, _ in run), [d for _, _, d in run]))
+                run = [chunk]
+            passages.append((min(r for _, r, _ in run), [d for _, _, d in run]))
+
+        passages.sort(key=lambda p: p[0])
+        return passages
+
+    def _truncate(self, text: str, tokens: int) -> str:
+        cut = text[:tokens * 4]
+        # End on a word boundary
+        return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+    def pack(self, docs):
+        """Return the packed passages as Documents (metadata of their first
+        chunk plus `chunk_indices`), best first."""
+        raw_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+
+        kept = []
+        kept_shingles = []
+        used_tokens = 0
+        for _, chunks in self._passages(docs):
+            text = chunks[0].page_content
+            for chunk in chunks[1:]:
+                text = self._join(text, chunk.page_content)
+
+            shingles = _shingles(text)
+            if any(_containment(shingles, other) >= self.duplicate_threshold for other in kept_shingles):
+                metrics.context_pack.incr("near_duplicate")
+                continue
+
+            tokens = estimate_tokens(text)
+            if self.token_budget and used_tokens + tokens > self.token_budget:
+                if kept:
+                    # A smaller passage further down may still fit
+                    metrics.context_pack.incr("over_budget")
+                    continue
+                text = self._truncate(text, self.token_budget)
+                tokens = estimate_tokens(text)
+                metrics.context_pack.incr("truncated")
+
+            metadata = dict(chunks[0].metadata)
+            if len(chunks) > 1:
+                metadata["chunk_indices"] = [chunk.metadata["chunk_index"] for chunk in chunks]
+            kept.append(Document(page_content=text, metadata=metadata))
+            kept_shingles.append(shingles)
+            used_tokens += tokens
+
+        metrics.context_tokens.incr("raw", raw_tokens)
+        metrics.context_tokens.incr("packed", used_tokens)
+        return kept
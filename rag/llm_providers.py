@@ -0,0 +1,124 @@
+import asyncio
+import random
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .prompts import fallback_answer
+from config import settings
+
+_CONTEXT = re.compile(r"Context:\s*(.*)", re.DOTALL)
+
+class FakeChatModel(BaseChatModel):
+    """Offline chat model with realistic timing, for load tests and profiling.
+
+    The answer is the first `output_tokens` words of the prompt's context
+    (the fallback answer when the context is empty). Time to first token is
+    lognormal around `ttft_ms`; each following token arrives after a
+    lognormal gap around 1 / `tokens_per_second`. The RNG is seeded from
+    `seed` and the prompt, so the same prompt always replays the same
+    answer and timings.
+    """
+
+    ttft_ms: float = 400.0
+    ttft_sigma: float = 0.3
+    tokens_per_second: float = 80.0
+    token_sigma: float = 0.2
+    output_tokens: int = 80
+    seed: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-offline"
+
+    def _plan(self, messages):
+        """Return (tokens, delays in seconds, input token estimate)."""
+        prompt = "\n".join(message.text for message in messages)
+        rng = random.Random(f"{self.seed}:{prompt}")
+
+        system = "\n".join(message.text for message in messages if message.type == "system")
+        match = _CONTEXT.search(system)
+        words = match.group(1).split() if match else []
+        if words:
+            words = words[:self.output_tokens]
+            tokens = [word + " " for word in words[:-1]] + [words[-1]]
+        else:
+            tokens = [fallback_answer]
+
+        delays = [self.ttft_ms / 1000 * rng.lognormvariate(0, self.ttft_sigma)]
+        delays += [rng.lognormvariate(0, self.token_sigma) / self.tokens_per_second for _ in tokens[1:]]
+        # Rough chars/4 token estimate, like the real usage metadata reports
+        return tokens, delays, max(1, len(prompt) // 4)
+
+    @staticmethod
+    def _usage(input_tokens, output_tokens):
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _result(self, tokens, input_tokens):
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(input_tokens, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunk(self, token, index, tokens, input_tokens):
+        # Usage rides on the first chunk only; chunks are summed by the caller
+        usage = self._usage(input_tokens, len(tokens)) if index == 0 else None
+        return ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        tokens, delays, input_tokens = self._plan(messages)
+        time.sleep(sum(delays))
+        return self._result(tokens, input_tokens)
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        tokens, delays, input_tokens = self._plan(messages)
+        await asyncio.sleep(sum(delays))
+        return self._result(tokens, input_tokens)
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        tokens, delays, input_tokens = self._plan(messages)
+        for index, (token, delay) in enumerate(zip(tokens, delays)):
+            time.sleep(delay)
+            yield self._chunk(token, index, tokens, input_tokens)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        tokens, delays, input_tokens = self._plan(messages)
+        for index, (token, delay) in enumerate(zip(tokens, delays)):
+            await asyncio.sleep(delay)
+            yield self._chunk(token, index, tokens, input_tokens)
+
+
+def _google_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=settings.LLM_MODEL, temperature=settings.LLM_TEMPERATURE)
+
+
+def _fake_llm():
+    return FakeChatModel(
+        ttft_ms=settings.FAKE_LLM_TTFT_MS,
+        ttft_sigma=settings.FAKE_LLM_TTFT_SIGMA,
+        tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+        token_sigma=settings.FAKE_LLM_TOKEN_SIGMA,
+        output_tokens=settings.FAKE_LLM_OUTPUT_TOKENS,
+        seed=settings.FAKE_LLM_SEED
+    )
+
+
+LLM_PROVIDERS = {
+    "google": _google_llm,
+    "fake": _fake_llm,
+}
+
+def create_llm():
+    provider = LLM_PROVIDERS.get(settings.LLM_PROVIDER)
+    if provider is None:
+        raise ValueError(
+            f"Unknown LLM_PROVIDER {settings.LLM_PROVIDER!r}, expected one of {sorted(LLM_PROVIDERS)}"
+        )
+    return provider()
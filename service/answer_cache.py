@@ -0,0 +1,202 @@
+import copy
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.performance_calc import Metrics
+
+metrics = Metrics()
+
+_WHITESPACE = re.compile(r"\s+")
+# Initial rows of the semantic tier's vector matrix (doubled as needed)
+_INITIAL_ROWS = 64
+
+def normalize_question(text: str) -> str:
+    """Canonical form used as the exact-match cache key."""
+    text = _WHITESPACE.sub(" ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+class _CacheEntry:
+    __slots__ = ("answer", "row", "created", "size")
+
+    def __init__(self, answer, row, created, size):
+        self.answer = answer
+        # Row of the entry's normalized vector in AnswerCache.matrix
+        self.row = row
+        self.created = created
+        self.size = size
+
+
+class AnswerCache:
+    """Two-tier cache of final RAG answers.
+
+    - Exact tier: keyed on the normalized question text.
+    - Semantic tier: cosine similarity between query embeddings.
+
+    The normalized vectors live in one preallocated matrix (row i belongs to
+    `row_keys[i]`, creation times alongside), updated in place on put and
+    remove, so a semantic lookup is a single matrix-vector product.
+
+    Entries are evicted LRU-first when either the entry or byte bound is hit,
+    and expire after `ttl_seconds`. Every lookup carries the current index
+    generation; a newer generation drops all entries built on the old index,
+    and lookups or puts carrying an older one are ignored.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, max_bytes, similarity_threshold):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+        self.matrix = None
+        self.created = None
+        self.row_keys = []
+
+    # ------------------------------
+    # Internal helpers (caller holds the lock)
+    # ------------------------------
+    def _sync_generation(self, generation):
+        """Move to `generation` if it is newer (dropping all entries). Returns
+        False for an older one: the caller is working on a replaced index."""
+        if generation < self.generation:
+            return False
+        if generation > self.generation:
+            self._clear()
+            self.generation = generation
+        return True
+
+    def _clear(self):
+        self.entries.clear()
+        self.row_keys.clear()
+        self.size_bytes = 0
+
+    def _is_expired(self, entry, now):
+        return now - entry.created > self.ttl_seconds
+
+    def _add_row(self, key, vec, created):
+        rows = len(self.row_keys)
+        if self.matrix is None or self.matrix.shape[1] != len(vec):
+            # First entry, or a different embedding size: start over
+            self._clear()
+            rows = 0
+            self.matrix = np.empty((_INITIAL_ROWS, len(vec)), dtype=np.float32)
+            self.created = np.empty(_INITIAL_ROWS)
+        elif rows == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+            self.created = np.concatenate([self.created, np.empty_like(self.created)])
+
+        self.matrix[rows] = vec
+        self.created[rows] = created
+        self.row_keys.append(key)
+        return rows
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size_bytes -= entry.size
+
+        # Keep the rows dense: the last row takes the freed one
+        last = len(self.row_keys) - 1
+        if entry.row != last:
+            moved = self.row_keys[last]
+            self.matrix[entry.row] = self.matrix[last]
+            self.created[entry.row] = self.created[last]
+            self.row_keys[entry.row] = moved
+            self.entries[moved].row = entry.row
+        self.row_keys.pop()
+
+    def _evict(self):
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes
+        ):
+            key = next(iter(self.entries))
+            self._remove(key)
+            metrics.answer_cache.incr("evicted")
+
+    # ------------------------------
+    # Public API
+    # ------------------------------
+    def get(self, question: str, generation: int):
+        """Exact-match lookup. Counts a hit only; misses are counted by `get_similar`."""
+        key = normalize_question(question)
+        with self.lock:
+            if not self._sync_generation(generation):
+                return None
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry, time.time()):
+                self._remove(key)
+                return None
+
+            self.entries.move_to_end(key)
+            metrics.answer_cache.incr("exact_hit")
+            return copy.deepcopy(entry.answer)
+
+    def get_similar(self, vector, generation: int):
+        """Semantic lookup using the query embedding."""
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+
+        with self.lock:
+            if not self._sync_generation(generation):
+                metrics.answer_cache.incr("miss")
+                return None
+            rows = len(self.row_keys)
+            if rows:
+                expired = np.flatnonzero(self.created[:rows] < time.time() - self.ttl_seconds)
+                for key in [self.row_keys[i] for i in expired]:
+                    self._remove(key)
+                rows = len(self.row_keys)
+
+            if not rows or norm == 0 or self.matrix.shape[1] != len(query):
+                metrics.answer_cache.incr("miss")
+                return None
+
+            scores = self.matrix[:rows] @ (query / norm)
+            best = int(np.argmax(scores))
+
+            if scores[best] < self.similarity_threshold:
+                metrics.answer_cache.incr("miss")
+                return None
+
+            key = self.row_keys[best]
+            self.entries.move_to_end(key)
+            metrics.answer_cache.incr("semantic_hit")
+            return copy.deepcopy(self.entries[key].answer)
+
+    def put(self, question: str, vector, answer: dict, generation: int):
+        key = normalize_question(question)
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+
+        size = len(key) + vec.nbytes + len(json.dumps(answer))
+
+        with self.lock:
+            # Answer was computed against an index that has since been replaced
+            if not self._sync_generation(generation):
+                return
+
+            if key in self.entries:
+                self._remove(key)
+            now = time.time()
+            row = self._add_row(key, vec, now)
+            self.entries[key] = _CacheEntry(copy.deepcopy(answer), row, now, size)
+            self.size_bytes += size
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self._clear()
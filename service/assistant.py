@@ -1,61 +1,290 @@
+import asyncio
+import copy
+import time
+
 from vector_store.chroma_manager import ChromaManager
 from vector_store.retriever import FastChromaRetriever
 from rag.chain_builder import RAGChainBuilder
 from rag.prompts import fallback_answer
+from service.answer_cache import AnswerCache, normalize_question
+from utils.executor import run_blocking
 from utils.logger import get_logger
+from utils.performance_calc import Metrics
+from utils.tracing import record_stage, span
 from config import settings
 
+metrics = Metrics()
+
 class AssistantService:
     def __init__(self, data_path, chroma_path):
         self.data_path = data_path
         self.chroma_path = chroma_path
         self.use_reranker = True
-        self.chain = None
+        # RAGChainBuilder holding the built chain; swapped as a whole on reindex
+        self.rag = None
         self.manager = None
+        self.embeddings = None
+        self.reranker_model = None
+        self.rerank_scheduler = None
+
+        # Bumped on every reindex; cached answers from older generations are dropped
+        self.index_generation = 0
+        # (normalized question, generation) -> task answering it; lives on the event loop thread
+        self.inflight = {}
+        self.cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.cache = AnswerCache(
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                max_bytes=settings.ANSWER_CACHE_MAX_BYTES,
+                similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD
+            )
 
         self.logger = get_logger("assistant_service")
 
     def initialize(self):
         self.manager = ChromaManager(self.data_path, self.chroma_path)
-        vector_store = self.manager.load_db()
-        retriever = FastChromaRetriever(vector_store, k=settings.VECTOR_STORE_K)
+        self.manager.load_db()
+        self.embeddings = self.manager.embeddings
+
+        if self.use_reranker:
+            from vector_store.reranker import RerankerWrapper
+            from vector_store.rerank_scheduler import RerankScheduler
+            self.reranker_model = RerankerWrapper.load_model()
+            # One scheduler for the process, so requests on old and new chains batch together
+            self.rerank_scheduler = RerankScheduler(
+                self.reranker_model,
+                max_batch_pairs=settings.RERANK_MAX_BATCH_PAIRS,
+                max_wait_ms=settings.RERANK_MAX_WAIT_MS
+            )
+
+        self.rag = self._build_chain()[1]
+
+    @property
+    def chain(self):
+        return self.rag.chain if self.rag else None
+
+    def _build_chain(self):
+        """Build (retriever, built RAGChainBuilder) on the existing Chroma handle and reranker model."""
+        retriever = FastChromaRetriever(self.manager.db, k=settings.VECTOR_STORE_K)
 
         if self.use_reranker:
             from vector_store.reranker import RerankerWrapper
-            retriever = RerankerWrapper(retriever, top_n=settings.RERANKER_TOP_N).get_retriever()
+            retriever = RerankerWrapper(
+                retriever,
+                top_n=settings.RERANKER_TOP_N,
+                model=self.reranker_model,
+                scheduler=self.rerank_scheduler
+            ).get_retriever()
+
+        rag = RAGChainBuilder(retriever)
+        rag.build()
+        return retriever, rag
+
+    def reindex(self, progress=None, filenames=None, known=None):
+        """Update the index, then hot-swap a warmed-up chain. Runs as a background job.
+
+        `filenames` limits the update to those files of the docs directory;
+        `known` passes hashes already computed for them (see ChromaManager.update_index).
+        """
+        progress = progress or (lambda **fields: None)
+        result, changed = self.manager.update_index(progress=progress, filenames=filenames, known=known)
 
-        self.chain = RAGChainBuilder(retriever).build()
-    
-    async def reindex(self):
-        result = self.manager.update_index()
+        if not changed:
+            # Index untouched: keep the chain and the generation, so cached answers stay valid
+            progress(stage="done")
+            return result
+
+        progress(stage="warming_up")
+        retriever, rag = self._build_chain()
+        retriever.invoke("warm-up")
+
+        # Single attribute assignment: in-flight queries keep the chain they started with
+        self.rag = rag
+        self.index_generation += 1
+        progress(stage="done")
         return result
 
-    async def query(self, query: str):
-        if not self.chain:
+    @staticmethod
+    def _sources(docs):
+        return [
+            {
+                "source": doc.metadata.get("source", "N/A"),
+                "page": str(doc.metadata.get("page", "N/A"))
+            }
+            for doc in docs
+        ]
+
+    @staticmethod
+    def _record_usage(usage):
+        metrics.tokens.incr("input", usage.get("input_tokens", 0))
+        metrics.tokens.incr("output", usage.get("output_tokens", 0))
+        metrics.tokens.incr("total", usage.get("total_tokens", 0))
+
+    def _build_response(self, query: str, result: dict):
+        answer = result["response"].content
+        usage_metadata = result["response"].usage_metadata or {}
+        self._record_usage(usage_metadata)
+
+        if answer == fallback_answer:
+            return {"answer": answer, "sources": [], "total_tokens": 0}
+
+        sources = self._sources(result["retrieved_docs"])
+        total_tokens = usage_metadata.get("total_tokens", 0)
+
+        self.logger.info(f"Query: {query} | Answer: {answer} | Sources: {sources} | Usage: {total_tokens}")
+
+        return {"answer": answer, "sources": sources, "total_tokens": total_tokens}
+
+    @staticmethod
+    def _deadline(started, latency_budget_ms):
+        budget_ms = latency_budget_ms if latency_budget_ms is not None else settings.RERANK_LATENCY_BUDGET_MS
+        return started + budget_ms / 1000 if budget_ms is not None else None
+
+    def _snapshot(self):
+        # A concurrent reindex may swap in a new chain mid-request.
+        # Generation is read first (reindex swaps the chain before bumping it),
+        # so an answer is never cached under a newer generation than its chain.
+        generation = self.index_generation
+        rag = self.rag
+
+        if not rag:
             raise Exception("RAG not initialized")
+        return generation, rag
 
-        try:
-            result = self.chain.invoke(query)
-            answer = result["response"].content
+    async def _lookup(self, query: str, generation):
+        """Return (cached response or None, query embedding or None)."""
+        if self.cache:
+            cached = self.cache.get(query, generation)
+            if cached is not None:
+                self.logger.info(f"Query: {query} | Served from exact answer cache")
+                return cached, None
+
+        # Embed once; the vector feeds both the semantic cache and the Chroma search
+        embedding = await run_blocking(self.embeddings.embed_query, query)
+
+        if self.cache:
+            cached = self.cache.get_similar(embedding, generation)
+            if cached is not None:
+                self.logger.info(f"Query: {query} | Served from semantic answer cache")
+                return cached, embedding
+
+        return None, embedding
+
+    async def query(self, query: str, latency_budget_ms=None):
+        """Answer a question. `latency_budget_ms` bounds retrieval + rerank; when
+        the reranker would not fit, the vector order is used instead.
+
+        Identical questions (after normalization) asked while one is already
+        being answered on the same index generation share that execution.
+        """
+        deadline = self._deadline(time.perf_counter(), latency_budget_ms)
+        generation, rag = self._snapshot()
 
-            if answer == fallback_answer:
-                return {"answer": answer, "sources": [], "total_tokens": 0}
+        if not settings.QUERY_COALESCING_ENABLED:
+            return await self._answer(query, generation, rag, deadline)
 
-            sources = [
-                {
-                    "source": doc.metadata.get("source", "N/A"),
-                    "page": str(doc.metadata.get("page", "N/A"))
-                }
-                for doc in result["retrieved_docs"]
-            ]
-            
-            usage_metadata = result["response"].usage_metadata
-            total_tokens = usage_metadata.get("total_tokens", 0)
+        key = (normalize_question(query), generation)
+        task = self.inflight.get(key)
+        if task is not None:
+            metrics.coalesce.incr("waiter")
+            # Shielded: a waiter disconnecting must not cancel the shared execution.
+            # Stages are traced on the leader's request; the waiter only sees the wait
+            with span("coalesced_wait"):
+                result = await asyncio.shield(task)
+            return copy.deepcopy(result)
 
-            self.logger.info(f"Query: {query} | Answer: {answer} | Sources: {sources} | Usage: {total_tokens}")
+        metrics.coalesce.incr("leader")
+        task = asyncio.ensure_future(self._answer(query, generation, rag, deadline))
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None) if self.inflight.get(key) is task else None)
+        return await asyncio.shield(task)
 
-            return {"answer": answer, "sources": sources, "total_tokens": total_tokens}
+    async def _answer(self, query: str, generation, rag, deadline):
+        try:
+            cached, embedding = await self._lookup(query, generation)
+            if cached is not None:
+                return cached
+
+            result = await rag.chain.ainvoke({"input": query, "embedding": embedding, "deadline": deadline})
+            response = self._build_response(query, result)
+
+            if self.cache:
+                self.cache.put(query, embedding, response, generation)
+
+            return response
 
         except Exception as e:
             self.logger.error(f"Error in query: {e}")
+            metrics.errors.incr("query")
             return {"answer": fallback_answer, "sources": [], "total_tokens": 0}
+
+    async def astream_query(self, query: str, latency_budget_ms=None):
+        """Answer a question as a stream of (event, data) pairs:
+        ("sources", [...]) once retrieval is done, ("token", text) per LLM
+        chunk, and ("usage", {...}) last. Records TTFT and inter-token gaps."""
+        started = time.perf_counter()
+        deadline = self._deadline(started, latency_budget_ms)
+        generation, rag = self._snapshot()
+
+        parts = []
+        sources = []
+        response = None
+        last_token = None
+
+        try:
+            cached, embedding = await self._lookup(query, generation)
+            if cached is not None:
+                yield "sources", cached["sources"]
+                yield "token", cached["answer"]
+                yield "usage", {"total_tokens": cached["total_tokens"], "cached": True}
+                return
+
+            async for kind, value in rag.astream({"input": query, "embedding": embedding, "deadline": deadline}):
+                if kind == "retrieved_docs":
+                    sources = self._sources(value)
+                    yield "sources", sources
+                    continue
+
+                # Chunks add up: the merged message carries the final usage metadata
+                response = value if response is None else response + value
+                text = value.text
+                if not text:
+                    continue
+
+                now = time.perf_counter()
+                if last_token is None:
+                    record_stage("ttft", (now - started) * 1000, metrics.ttft)
+                else:
+                    metrics.inter_token.record((now - last_token) * 1000)
+                last_token = now
+
+                parts.append(text)
+                yield "token", text
+
+        except Exception as e:
+            self.logger.error(f"Error in streaming query: {e}")
+            metrics.errors.incr("stream")
+            if not parts:
+                yield "token", fallback_answer
+            yield "usage", {"total_tokens": 0, "error": str(e)}
+            return
+
+        answer = "".join(parts)
+        usage = (response.usage_metadata if response else None) or {}
+        self._record_usage(usage)
+        result = {
+            "answer": answer,
+            "sources": [] if answer == fallback_answer else sources,
+            "total_tokens": usage.get("total_tokens", 0)
+        }
+        self.logger.info(f"Query: {query} | Answer: {answer} | Sources: {sources} | Usage: {result['total_tokens']}")
+
+        if self.cache:
+            self.cache.put(query, embedding, result, generation)
+
+        yield "usage", {
+            "total_tokens": result["total_tokens"],
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0)
+        }
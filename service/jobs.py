@@ -0,0 +1,107 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.logger import get_logger
+from utils.performance_calc import Metrics
+
+metrics = Metrics()
+
+logger = get_logger("jobs")
+
+class Job:
+    """Status record for one background job."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "pending"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def update_progress(self, **fields):
+        with self.lock:
+            self.progress.update(fields)
+
+    def wait(self, timeout=None) -> bool:
+        """Block until the job has finished. Returns False on timeout."""
+        return self.done.wait(timeout)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """Runs jobs one at a time on a background thread and keeps recent history.
+
+    A single worker serializes index writes, so two reindex requests can never
+    interleave their Chroma updates.
+    """
+
+    def __init__(self, max_history=100):
+        self.max_history = max_history
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-runner")
+
+    def submit(self, kind: str, func, *args, **kwargs) -> Job:
+        """Queue `func(*args, progress=job.update_progress, **kwargs)`."""
+        job = Job(kind)
+        with self.lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_history:
+                self.jobs.popitem(last=False)
+
+        self.executor.submit(self._run, job, func, args, kwargs)
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        with job.lock:
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            result = func(*args, progress=job.update_progress, **kwargs)
+            with job.lock:
+                job.result = result
+                job.status = "succeeded"
+            logger.info(f"{job.kind} job {job.id} succeeded")
+        except Exception as err:
+            with job.lock:
+                job.error = str(err)
+                job.status = "failed"
+            metrics.errors.incr("job")
+            logger.error(f"{job.kind} job {job.id} failed | Error ==> {err}\n{traceback.format_exc()}")
+        finally:
+            with job.lock:
+                job.finished_at = time.time()
+            job.done.set()
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
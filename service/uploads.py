@@ -0,0 +1,273 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from vector_store.change_detector import KnownDigest
+from utils.executor import run_blocking
+from utils.logger import get_logger
+
+logger = get_logger("uploads")
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+PARTIAL_SUFFIX = ".part"
+BACKUP_SUFFIX = ".bak"
+# Multipart field carrying the uploaded files
+UPLOAD_FIELD = "files"
+
+class UploadError(ValueError):
+    """Raised for an upload that is rejected (bad request, name or file type)."""
+
+
+class UploadTooLarge(UploadError):
+    """Raised for a file or request body over its size limit."""
+
+
+def safe_filename(filename: str, extensions) -> str:
+    """Return the bare filename to store an upload under, or raise UploadError."""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if not name or name.startswith("."):
+        raise UploadError(f"Invalid filename: {filename!r}")
+    if not name.lower().endswith(extensions):
+        raise UploadError(f"Unsupported file type: {name}")
+    return name
+
+
+def _write_chunk(file, hashers, chunk):
+    file.write(chunk)
+    for hasher in hashers:
+        hasher.update(chunk)
+
+
+def _finish(file):
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+
+
+class StagedUpload:
+    """An upload fully written (and hashed) to its hidden `.part` file, not yet in place."""
+
+    def __init__(self, filename, tmp_path, final_path, file_hash, content_digest):
+        self.filename = filename
+        self.tmp_path = tmp_path
+        self.final_path = final_path
+        self.file_hash = file_hash
+        self.content_digest = content_digest
+
+
+class _UploadReceiver:
+    """python_multipart callbacks writing (and hashing) each uploaded file
+    straight to a hidden `.part` file in `data_path`, as its bytes arrive."""
+
+    def __init__(self, data_path: str, extensions, max_bytes: int):
+        self.data_path = data_path
+        self.extensions = extensions
+        self.max_bytes = max_bytes
+        self.staged = []
+
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        # File part being written (None while skipping other fields)
+        self._file = None
+        self._filename = None
+        self._tmp_path = None
+        self._hashers = None
+        self._size = 0
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    @property
+    def writing(self) -> bool:
+        return self._file is not None
+
+    def on_part_begin(self):
+        self._disposition = b""
+
+    def on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") != UPLOAD_FIELD.encode() or b"filename" not in options:
+            # Not one of the uploaded files: skip it
+            return
+
+        self._filename = safe_filename(options[b"filename"].decode("utf-8", "replace"), self.extensions)
+        self._tmp_path = os.path.join(self.data_path, f".{self._filename}.{uuid.uuid4().hex}{PARTIAL_SUFFIX}")
+        self._hashers = (hashlib.md5(), hashlib.blake2b())
+        self._size = 0
+        self._file = open(self._tmp_path, "wb")
+
+    def on_part_data(self, data, start, end):
+        if not self.writing:
+            return
+        self._size += end - start
+        if self._size > self.max_bytes:
+            raise UploadTooLarge(f"{self._filename} exceeds the {self.max_bytes} byte upload limit")
+        _write_chunk(self._file, self._hashers, data[start:end])
+
+    def on_part_end(self):
+        if not self.writing:
+            return
+        _finish(self._file)
+        self._file = None
+
+        md5, blake2b = self._hashers
+        self.staged.append(StagedUpload(
+            self._filename,
+            self._tmp_path,
+            os.path.join(self.data_path, self._filename),
+            md5.hexdigest(),
+            blake2b.hexdigest()
+        ))
+        logger.info(f"Staged upload {self._filename} ({self._size} bytes)")
+
+    def abort(self):
+        """Delete everything written so far."""
+        if self.writing:
+            self._file.close()
+            self._file = None
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+        discard_uploads(self.staged)
+
+
+def _feed(parser, chunks):
+    for chunk in chunks:
+        parser.write(chunk)
+
+
+async def receive_uploads(request, data_path: str, extensions, max_bytes: int, max_request_bytes: int):
+    """Parse a multipart/form-data request body as it streams in, writing
+    each file of the `files` field to a hidden `.part` file in `data_path`
+    and hashing it on the way; nothing is spooled or copied in between.
+
+    Returns the StagedUpload of every file. The change detector and watcher
+    ignore `.part` files; `commit_uploads` moves them into place. The
+    digests are the same MD5 `file_hash` and BLAKE2b content digest the
+    change detector would have computed.
+
+    Raises UploadTooLarge as soon as the Content-Length, the bytes received
+    or a single file goes over its limit, and UploadError for any other
+    rejected request. Nothing is left behind in either case.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data request body")
+
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_request_bytes:
+        raise UploadTooLarge(f"Request body exceeds the {max_request_bytes} byte upload limit")
+
+    receiver = _UploadReceiver(data_path, extensions, max_bytes)
+    parser = MultipartParser(params[b"boundary"], receiver.callbacks())
+    received = 0
+    pending, pending_size = [], 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_request_bytes:
+                raise UploadTooLarge(f"Request body exceeds the {max_request_bytes} byte upload limit")
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if pending_size >= UPLOAD_CHUNK_SIZE:
+                # Parse + write off the event loop, about a chunk at a time
+                await run_blocking(_feed, parser, pending)
+                pending, pending_size = [], 0
+
+        await run_blocking(_feed, parser, pending)
+        parser.finalize()
+
+        if receiver.writing:
+            raise UploadError("Incomplete multipart request body")
+        if not receiver.staged:
+            raise UploadError(f"No files uploaded (multipart field '{UPLOAD_FIELD}')")
+    except MultipartParseError as err:
+        receiver.abort()
+        raise UploadError(f"Malformed multipart request body: {err}") from err
+    except BaseException:
+        receiver.abort()
+        raise
+
+    return receiver.staged
+
+
+def _backup(path: str) -> str:
+    """Keep the current version of `path` under a hidden name (ignored like `.part` files)."""
+    directory, filename = os.path.split(path)
+    backup = os.path.join(directory, f".{filename}.{uuid.uuid4().hex}{BACKUP_SUFFIX}")
+    try:
+        # A hard link keeps the same inode, so a restore looks unchanged to the change detector
+        os.link(path, backup)
+    except OSError:
+        shutil.copy2(path, backup)
+    return backup
+
+
+def commit_uploads(staged):
+    """Move staged uploads into place, all or none. Returns {filename: KnownDigest}.
+
+    A file being replaced is backed up first; if any move fails, the files
+    already moved are rolled back (previous versions restored, new files
+    removed) before the error is raised.
+    """
+    known = {}
+    committed = []  # (upload, backup path or None)
+    try:
+        for upload in staged:
+            backup = _backup(upload.final_path) if os.path.exists(upload.final_path) else None
+            committed.append((upload, backup))
+            # Atomic: the watcher / change detector never see a half-written file
+            os.replace(upload.tmp_path, upload.final_path)
+            known[upload.filename] = KnownDigest(
+                os.stat(upload.final_path), upload.file_hash, upload.content_digest
+            )
+    except BaseException:
+        _rollback(committed)
+        raise
+
+    for _, backup in committed:
+        if backup:
+            os.remove(backup)
+    return known
+
+
+def _rollback(committed):
+    for upload, backup in reversed(committed):
+        try:
+            if backup:
+                os.replace(backup, upload.final_path)
+            elif not os.path.exists(upload.tmp_path) and os.path.exists(upload.final_path):
+                # Moved in place before the failure: remove it
+                os.remove(upload.final_path)
+        except OSError as err:
+            logger.error(f"Could not roll back upload {upload.filename}: {err}")
+
+
+def discard_uploads(staged):
+    """Delete the `.part` files of staged uploads that will not be committed."""
+    for upload in staged:
+        if os.path.exists(upload.tmp_path):
+            os.remove(upload.tmp_path)
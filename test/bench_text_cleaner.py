@@ -0,0 +1,156 @@
+"""Micro-benchmark for preprocess.text_cleaner.clean_text.
+
+Builds a synthetic multi-megabyte corpus of PDF-like pages, checks that the
+precompiled single-pass cleaner produces exactly the same output as the
+original multi-pass implementation, and reports lines/sec for both.
+
+    PYTHONPATH=. python test/bench_text_cleaner.py --size-mb 8
+"""
+import argparse
+import random
+import re
+import time
+from collections import Counter
+
+from preprocess.text_cleaner import clean_text
+
+
+def legacy_clean_text(text: str) -> str:
+    """Reference copy of the original multi-pass cleaner (equivalence oracle)."""
+    text = text.replace("\xa0", " ")
+    text = text.replace("\u200b", "")
+    text = text.replace("\ufeff", "")
+
+    lines = [line.strip() for line in text.split("\n")]
+
+    def is_noise(line):
+        return (
+            len(line) <= 1 or
+            re.fullmatch(r"[_\-=]{3,}", line) is not None or
+            re.fullmatch(r"[|]{3,}", line) is not None
+        )
+
+    lines = [line for line in lines if not is_noise(line)]
+
+    page_num_patterns = [
+        r"^page\s*\d+\s*of\s*\d+$",
+        r"^page\s*\d+$",
+        r"^\d+\s*/\s*\d+$",
+        r"^-\s*\d+\s*-$",
+        r"^\d+$",
+    ]
+
+    def is_page_number(line):
+        return any(re.match(p, line, flags=re.IGNORECASE) for p in page_num_patterns)
+
+    lines = [line for line in lines if not is_page_number(line)]
+
+    footer_patterns = [
+        r"confidential",
+        r"all rights reserved",
+        r"internal use only",
+        r"do not distribute",
+        r"printed on.*",
+        r"copyright.*",
+        r"company name.*",
+    ]
+
+    def is_footer(line):
+        return any(re.search(p, line, flags=re.IGNORECASE) for p in footer_patterns)
+
+    lines = [line for line in lines if not is_footer(line)]
+
+    counts = Counter(lines)
+    threshold = max(3, int(len(lines) * 0.20))
+
+    lines = [line for line in lines if counts[line] < threshold]
+
+    text = " ".join(lines)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+WORDS = (
+    "revenue policy employee onboarding quarterly report compliance travel "
+    "expense reimbursement security incident vendor contract benefits leave "
+    "approval manager review process system access data retention audit"
+).split()
+
+NOISE_LINES = [
+    "", " ", "x", "-----", "=====", "_____", "|||", "||||||",
+    "Page 3", "PAGE 12 of 40", "page7", "3 / 40", "- 12 -", "42",
+    "Confidential", "All Rights Reserved.", "INTERNAL USE ONLY",
+    "Do not distribute outside the company", "Printed on 2024-01-01",
+    "Copyright 2024 ACME", "Company Name Ltd.",
+    "Section 2 is confidential-ish", "Paged 3 times", "page 3 of",
+    # Non-ASCII lines exercise the case-insensitive regex fallback
+    "Do not di\u017ftribute", "Caf\xe9 menu \u2014 Confidential", "\u0130nternal use only",
+    "R\xe9sum\xe9 of the d\xe9partement", "PAGE \u0663", "\u0661\u0662",
+]
+
+
+def make_page(rng: random.Random, page_no: int) -> str:
+    lines = ["ACME Corp Employee Handbook", f"Chapter {page_no // 10}"]
+    for _ in range(rng.randint(30, 60)):
+        roll = rng.random()
+        if roll < 0.15:
+            lines.append(rng.choice(NOISE_LINES))
+        elif roll < 0.20:
+            # Invisible characters and odd spacing
+            lines.append(f"\ufeff  {rng.choice(WORDS)}\xa0{rng.choice(WORDS)}\u200b\t{rng.choice(WORDS)}  ")
+        else:
+            n = rng.randint(4, 18)
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + ".")
+    lines.append(f"Page {page_no} of 999")
+    return "\n".join(lines)
+
+
+def make_corpus(size_mb: float, seed: int):
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    pages, size, page_no = [], 0, 1
+    while size < target:
+        page = make_page(rng, page_no)
+        pages.append(page)
+        size += len(page)
+        page_no += 1
+    return pages
+
+
+def bench(func, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for page in pages:
+            func(page)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    pages = make_corpus(args.size_mb, args.seed)
+    total_lines = sum(page.count("\n") + 1 for page in pages)
+    total_mb = sum(len(p) for p in pages) / (1024 * 1024)
+    print(f"Corpus: {len(pages)} pages | {total_lines} lines | {total_mb:.1f} MB")
+
+    mismatches = [i for i, page in enumerate(pages) if clean_text(page) != legacy_clean_text(page)]
+    if mismatches:
+        raise SystemExit(f"Output mismatch on {len(mismatches)} page(s), first at index {mismatches[0]}")
+    print("Equivalence: OK (all pages identical)")
+
+    legacy_s = bench(legacy_clean_text, pages, args.repeat)
+    current_s = bench(clean_text, pages, args.repeat)
+
+    print(f"legacy  : {total_lines / legacy_s:>12,.0f} lines/sec ({legacy_s:.3f}s)")
+    print(f"current : {total_lines / current_s:>12,.0f} lines/sec ({current_s:.3f}s)")
+    print(f"speedup : {legacy_s / current_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
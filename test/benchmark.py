@@ -0,0 +1,316 @@
+"""Replay benchmark for the RAG pipeline.
+
+Replays a JSONL workload (one {"question": ...} per line) against the HTTP
+API or an in-process AssistantService, at one or more concurrency levels
+(closed loop: each worker sends its next question as soon as the previous
+answer arrives). Each level reports end-to-end latency percentiles,
+throughput, error rate and the server's per-stage metrics (embedding,
+retrieval, rerank, LLM, ...), all tagged with the git commit so runs can be
+compared across commits.
+
+    # against a running API
+    PYTHONPATH=. python test/benchmark.py --target http --concurrency 1,4,16 --output before.json
+
+    # fully offline, in-process
+    EMBEDDING_PROVIDER=hashing LLM_PROVIDER=fake DEFAULT_CHROMA_PATH=/tmp/bench_db \\
+        PYTHONPATH=. python test/benchmark.py --target service --reindex --no-cache --output after.json
+
+    # regression check (exit code 1 if p95 latency or throughput regress past --threshold)
+    PYTHONPATH=. python test/benchmark.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from config import settings
+
+STAGES = ("embedding", "embedding_cached", "retrieval", "rerank", "llm", "ttft", "total")
+
+
+# ---------------------------
+# Workload
+# ---------------------------
+def load_workload(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            question = record.get("question") or record.get("query") or record.get("input")
+            if question:
+                questions.append(question)
+    if not questions:
+        raise SystemExit(f"No questions found in {path} (expected one {{\"question\": ...}} per line)")
+    return questions
+
+
+def git_commit():
+    # Ask the repo this script lives in, whatever the working directory
+    repo = os.path.dirname(os.path.abspath(__file__))
+
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True, text=True, cwd=repo).stdout.strip()
+    try:
+        commit = git("rev-parse", "HEAD") or None
+        return {"commit": commit, "dirty": bool(git("status", "--porcelain", "--untracked-files=no")) if commit else None}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    arr = np.array(values)
+    return {
+        "count": len(arr),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p90": float(np.percentile(arr, 90)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+    }
+
+
+# ---------------------------
+# Targets
+# ---------------------------
+class HttpTarget:
+    def __init__(self, url, timeout):
+        self.url = url if url.endswith("/") else url + "/"
+        self.timeout = timeout
+        self.session = None
+
+    async def __aenter__(self):
+        import aiohttp
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def ask(self, question):
+        async with self.session.post(self.url + "query", json={"question": question}) as resp:
+            body = await resp.json(content_type=None)
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}: {body}")
+            return body
+
+    async def reset_metrics(self):
+        async with self.session.post(self.url + "reset_metrics") as resp:
+            await resp.read()
+
+    async def metrics(self):
+        async with self.session.get(self.url + "metrics") as resp:
+            return await resp.json()
+
+
+class ServiceTarget:
+    def __init__(self, reindex, no_cache):
+        from service.assistant import AssistantService
+        from utils.performance_calc import Metrics
+
+        self.metrics_store = Metrics()
+        self.assistant = AssistantService(settings.DEFAULT_DOCS_PATH, settings.DEFAULT_CHROMA_PATH)
+        self.assistant.initialize()
+        if reindex:
+            print(f"Reindex: {self.assistant.reindex()}", file=sys.stderr)
+        if no_cache:
+            self.assistant.cache = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def ask(self, question):
+        t0 = time.time()
+        result = await self.assistant.query(question)
+        # /query records the end-to-end total; do the same in-process
+        self.metrics_store.total.record((time.time() - t0) * 1000)
+        return result
+
+    async def reset_metrics(self):
+        self.metrics_store.reset_all()
+
+    async def metrics(self):
+        return self.metrics_store.stats()
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+async def run_level(target, questions, concurrency, total_requests):
+    feed = itertools.cycle(questions)
+    remaining = [total_requests]
+    latencies, errors, fallbacks = [], [], [0]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            question = next(feed)
+            start = time.perf_counter()
+            try:
+                result = await target.ask(question)
+                if not result.get("sources"):
+                    fallbacks[0] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as err:
+                errors.append(str(err)[:200])
+
+    await target.reset_metrics()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    server = await target.metrics()
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "errors": len(errors),
+        "error_rate": len(errors) / total_requests if total_requests else 0.0,
+        "error_samples": sorted(set(errors))[:5],
+        "no_source_answers": fallbacks[0],
+        "latency_ms": percentiles(latencies),
+        "stages": {stage: server.get(stage, {}) for stage in STAGES},
+        "server_metrics": server,
+    }
+
+
+async def run_benchmark(args):
+    questions = load_workload(args.workload)
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    if args.target == "http":
+        target = HttpTarget(args.url, args.timeout)
+    else:
+        target = ServiceTarget(args.reindex, args.no_cache)
+
+    results = []
+    async with target:
+        for _ in range(args.warmup):
+            await target.ask(questions[0])
+
+        for concurrency in levels:
+            requests = args.requests or len(questions) * max(1, concurrency)
+            print(f"concurrency={concurrency} requests={requests} ...", file=sys.stderr)
+            level = await run_level(target, questions, concurrency, requests)
+            results.append(level)
+            print(
+                f"  {level['throughput_rps']:.2f} req/s, "
+                f"p50={level['latency_ms'].get('p50', 0):.0f}ms p95={level['latency_ms'].get('p95', 0):.0f}ms, "
+                f"errors={level['errors']}",
+                file=sys.stderr
+            )
+
+    return {
+        "meta": {
+            **git_commit(),
+            "timestamp": time.time(),
+            "target": args.target,
+            "url": args.url if args.target == "http" else None,
+            "workload": args.workload,
+            "workload_size": len(questions),
+            "python": platform.python_version(),
+            "settings": {
+                "EMBEDDING_PROVIDER": settings.EMBEDDING_PROVIDER,
+                "LLM_PROVIDER": settings.LLM_PROVIDER,
+                "VECTOR_STORE_K": settings.VECTOR_STORE_K,
+                "RERANKER_TOP_N": settings.RERANKER_TOP_N,
+                "ANSWER_CACHE_ENABLED": settings.ANSWER_CACHE_ENABLED and not args.no_cache,
+            },
+        },
+        "levels": results,
+    }
+
+
+# ---------------------------
+# Comparison
+# ---------------------------
+def compare(baseline_path, candidate_path, threshold):
+    """Print per-level deltas; return True when a level regressed past `threshold`."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    def pct(old, new):
+        return (new - old) / old * 100 if old else 0.0
+
+    print(f"baseline  {baseline['meta'].get('commit')}  vs  candidate  {candidate['meta'].get('commit')}")
+    base_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    regressed = False
+
+    for level in candidate["levels"]:
+        old = base_levels.get(level["concurrency"])
+        if old is None:
+            continue
+
+        print(f"\nconcurrency={level['concurrency']}")
+        rows = [("throughput_rps", old["throughput_rps"], level["throughput_rps"], True)]
+        for key in ("p50", "p95", "p99"):
+            rows.append((f"latency {key}", old["latency_ms"].get(key, 0), level["latency_ms"].get(key, 0), False))
+        for stage in STAGES:
+            if old["stages"].get(stage) and level["stages"].get(stage):
+                rows.append((f"{stage} p95", old["stages"][stage]["p95"], level["stages"][stage]["p95"], False))
+        rows.append(("error_rate", old["error_rate"], level["error_rate"], False))
+
+        for name, before, after, higher_is_better in rows:
+            delta = pct(before, after)
+            worse = -delta if higher_is_better else delta
+            flag = ""
+            if name in ("throughput_rps", "latency p95") and worse > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"  {name:<22} {before:>10.2f} -> {after:>10.2f}  ({delta:+.1f}%){flag}")
+
+        if level["error_rate"] > old["error_rate"]:
+            regressed = True
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("http", "service"), default="http")
+    parser.add_argument("--url", default=settings.AI_RAG_API_URL)
+    parser.add_argument("--workload", default="test/workload.jsonl")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels to sweep")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default: workload size x concurrency)")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--reindex", action="store_true", help="service target: update the index first")
+    parser.add_argument("--no-cache", action="store_true", help="service target: disable the answer cache")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"))
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
+"""Load tests for the /query endpoint.
+
+Closed loop (`run_test`, also behind POST /concurrency_test): fixed workers,
+each waiting for its response before sending again. Open loop
+(`run_open_loop`, `run_ramp`): requests follow a constant or Poisson
+arrival schedule regardless of response times.
+
+    PYTHONPATH=. python test/concurrency_test.py --mode open --rate 5 --duration 60
+    PYTHONPATH=. python test/concurrency_test.py --mode ramp --start-rate 1 --step 2 --max-rate 40
+"""
 import asyncio
 import aiohttp
+import random
+import sys
 import time
 import numpy as np
 from config import settings
+from utils.histogram import LatencyHistogram
 
 URL = settings.AI_RAG_API_URL + "query"
 CONCURRENCY = 20
@@ -47,3 +60,153 @@ async def run_test():
         "p95": p95,
         "errors": errors
     }
+
+
+# ---------------------------
+# Open-loop load (coordinated-omission corrected)
+# ---------------------------
+def arrival_offsets(rate, duration, arrival="poisson", seed=0):
+    """Intended send times (seconds from start) for `rate` req/s over `duration`."""
+    if arrival == "constant":
+        return [i / rate for i in range(int(rate * duration))]
+
+    rng = random.Random(seed)
+    offsets, t = [], rng.expovariate(rate)
+    while t < duration:
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+
+async def run_open_loop(rate, duration, arrival="poisson", questions=("test",), url=URL,
+                        timeout=120, max_inflight=1000, seed=0):
+    """Send requests on a fixed schedule, independent of response times.
+
+    Latency is measured from each request's *intended* send time, so time a
+    request spends waiting because the client or server fell behind counts
+    against it (coordinated-omission correction). `service_ms` measures from
+    the actual send for comparison.
+    """
+    offsets = arrival_offsets(rate, duration, arrival, seed)
+    latency = LatencyHistogram()
+    service = LatencyHistogram()
+    errors = []
+    send_lag = LatencyHistogram()
+
+    async def fire(session, intended, question):
+        sent = time.perf_counter()
+        send_lag.record((sent - intended) * 1000)
+        try:
+            async with session.post(url, json={"question": question}) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors.append(resp.status)
+                    return
+        except Exception as e:
+            errors.append(str(e))
+            return
+        done = time.perf_counter()
+        latency.record((done - intended) * 1000)
+        service.record((done - sent) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=max_inflight)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        start = time.perf_counter()
+        tasks = []
+        for i, offset in enumerate(offsets):
+            intended = start + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(session, intended, questions[i % len(questions)])))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "arrival": arrival,
+        "offered_rps": rate,
+        "sent": len(offsets),
+        # Poisson arrivals vary around `rate`; compare against what was actually sent
+        "sent_rps": len(offsets) / duration if duration else 0.0,
+        "achieved_rps": latency.count / elapsed if elapsed else 0.0,
+        "errors": len(errors),
+        "error_rate": len(errors) / len(offsets) if offsets else 0.0,
+        "latency_ms": latency.summary(),
+        "service_ms": service.summary(),
+        "send_lag_ms": send_lag.summary(),
+    }
+
+
+async def run_ramp(start_rate, step, max_rate, step_duration, arrival="poisson", questions=("test",),
+                   url=URL, slo_ms=None, min_efficiency=0.9):
+    """Raise the arrival rate step by step until the endpoint saturates.
+
+    A step is saturated when achieved throughput falls below `min_efficiency`
+    of the rate actually sent, errors appear, or p99 exceeds `slo_ms` (default: 5x
+    the first step's p99). The knee is the last unsaturated rate.
+    """
+    steps, knee, baseline_p99 = [], None, None
+    rate = start_rate
+    while rate <= max_rate:
+        result = await run_open_loop(rate, step_duration, arrival, questions, url)
+        steps.append(result)
+
+        p99 = result["latency_ms"].get("p99", 0.0)
+        if baseline_p99 is None:
+            baseline_p99 = p99
+        limit = slo_ms if slo_ms is not None else 5 * baseline_p99
+
+        saturated = (
+            result["achieved_rps"] < min_efficiency * result["sent_rps"]
+            or result["error_rate"] > 0
+            or p99 > limit
+        )
+        print(
+            f"rate={rate:g}/s achieved={result['achieved_rps']:.2f}/s p99={p99:.0f}ms "
+            f"p99.9={result['latency_ms'].get('p99.9', 0):.0f}ms errors={result['errors']}"
+            f"{'  <- saturated' if saturated else ''}",
+            file=sys.stderr
+        )
+        if saturated:
+            break
+        knee = rate
+        rate += step
+
+    return {"knee_rps": knee, "steps": steps}
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Load test the /query endpoint.")
+    parser.add_argument("--mode", choices=("closed", "open", "ramp"), default="open")
+    parser.add_argument("--url", default=URL)
+    parser.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    parser.add_argument("--rate", type=float, default=5.0, help="open: requests/sec")
+    parser.add_argument("--duration", type=float, default=60.0, help="open: seconds")
+    parser.add_argument("--start-rate", type=float, default=1.0)
+    parser.add_argument("--step", type=float, default=1.0)
+    parser.add_argument("--max-rate", type=float, default=50.0)
+    parser.add_argument("--step-duration", type=float, default=30.0)
+    parser.add_argument("--slo-ms", type=float, help="ramp: p99 limit that marks saturation")
+    parser.add_argument("--workload", default="test/workload.jsonl", help="JSONL with one {\"question\": ...} per line")
+    args = parser.parse_args()
+
+    from benchmark import load_workload
+    questions = load_workload(args.workload)
+
+    if args.mode == "closed":
+        result = asyncio.run(run_test())
+    elif args.mode == "open":
+        result = asyncio.run(run_open_loop(args.rate, args.duration, args.arrival, questions, args.url))
+    else:
+        result = asyncio.run(run_ramp(
+            args.start_rate, args.step, args.max_rate, args.step_duration,
+            args.arrival, questions, args.url, args.slo_ms
+        ))
+    print(json.dumps(result, indent=2, default=float))
+
+
+if __name__ == "__main__":
+    main()
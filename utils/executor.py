@@ -0,0 +1,22 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+
+# Shared, bounded pool for blocking work (network SDK calls, Chroma search, reranking)
+# issued from the async query path. Bounding it keeps a burst of requests from
+# spawning an unbounded number of threads.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.EXECUTOR_MAX_WORKERS,
+    thread_name_prefix="rag-worker"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the shared worker pool and await its result.
+
+    The caller's context is copied, so the request trace follows the call.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, ctx.run, functools.partial(func, *args, **kwargs))
@@ -1,30 +1,53 @@
 import hashlib
+import mmap
 import os
 
+READ_CHUNK_SIZE = 1024 * 1024       # 1 MB reads
+MMAP_THRESHOLD = 8 * 1024 * 1024    # hash files >= 8 MB through mmap
+
 class HashUtils:
     @staticmethod
-    def md5_file(path: str) -> str:
-        """Compute MD5 hash of a file."""
+    def _digest_file(path: str, *hashers):
+        """Feed a file into every hasher in one pass, with large reads or mmap
+        for big files. Returns the hex digests in the same order.
+
+        hashlib releases the GIL on large buffers, so this scales across threads.
+        """
         if not os.path.exists(path):
             raise FileNotFoundError(f"File not found: {path}")
 
-        hasher = hashlib.md5()
         with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for hasher in hashers:
+                        hasher.update(mm)
+            else:
+                for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                    for hasher in hashers:
+                        hasher.update(chunk)
+        return [hasher.hexdigest() for hasher in hashers]
+
+    @staticmethod
+    def md5_file(path: str) -> str:
+        """Compute MD5 hash of a file (the `file_hash` stored in chunk metadata)."""
+        return HashUtils._digest_file(path, hashlib.md5())[0]
+
+    @staticmethod
+    def blake2b_file(path: str) -> str:
+        """Compute BLAKE2b hash of a file. Faster than MD5; used for change detection."""
+        return HashUtils._digest_file(path, hashlib.blake2b())[0]
+
+    @staticmethod
+    def md5_blake2b_file(path: str):
+        """Compute (MD5, BLAKE2b) of a file in a single read pass."""
+        md5, blake2b = HashUtils._digest_file(path, hashlib.md5(), hashlib.blake2b())
+        return md5, blake2b
 
     @staticmethod
     def sha256_file(path: str) -> str:
         """Compute SHA-256 hash of a file."""
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"File not found: {path}")
-
-        hasher = hashlib.sha256()
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return HashUtils._digest_file(path, hashlib.sha256())[0]
 
     @staticmethod
     def md5_text(text: str) -> str:
@@ -0,0 +1,112 @@
+import math
+import threading
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+class LatencyHistogram:
+    """HDR-style log-bucketed histogram with a bounded relative error.
+
+    Bucket `i` covers (gamma^(i-1), gamma^i] with gamma = (1+e)/(1-e), so any
+    percentile is reported within `relative_error` of the true value, from
+    sub-millisecond to minutes, in a few hundred buckets. Histograms with the
+    same `relative_error` merge exactly by adding bucket counts, so per-worker
+    or per-window histograms can be combined without keeping raw samples.
+    """
+
+    def __init__(self, relative_error=0.01, min_value=1e-3):
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+            self.count = 0
+            self.total = 0.0
+            self.min = math.inf
+            self.max = 0.0
+
+    def _key(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return max(1, math.ceil(math.log(value / self.min_value) / self.log_gamma))
+
+    def _value(self, key: int) -> float:
+        if key == 0:
+            return self.min_value
+        # Midpoint (in relative terms) of the bucket, which bounds the error
+        return self.min_value * 2 * self.gamma ** key / (self.gamma + 1)
+
+    def record(self, value: float, count: int = 1):
+        key = self._key(value)
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + count
+            self.count += count
+            self.total += value * count
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.gamma != self.gamma or other.min_value != self.min_value:
+            raise ValueError("Can only merge histograms with the same bucket layout")
+        with other.lock:
+            counts, count, total, lo, hi = dict(other.counts), other.count, other.total, other.min, other.max
+        with self.lock:
+            for key, n in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + n
+            self.count += count
+            self.total += total
+            self.min = min(self.min, lo)
+            self.max = max(self.max, hi)
+        return self
+
+    def percentile(self, q: float) -> float:
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(q / 100 * self.count))
+            seen = 0
+            for key in sorted(self.counts):
+                seen += self.counts[key]
+                if seen >= rank:
+                    return min(max(self._value(key), self.min), self.max)
+            return self.max
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        """{"count", "mean", "min", "max", "p50", ..., "p99.9"}; {} when empty."""
+        if not self.count:
+            return {}
+        stats = {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+        for q in percentiles:
+            stats[f"p{q:g}"] = self.percentile(q)
+        return stats
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "relative_error": self.relative_error,
+                "min_value": self.min_value,
+                "counts": {str(key): n for key, n in self.counts.items()},
+                "count": self.count,
+                "total": self.total,
+                "min": self.min if self.count else None,
+                "max": self.max,
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls(relative_error=data["relative_error"], min_value=data["min_value"])
+        hist.counts = {int(key): n for key, n in data["counts"].items()}
+        hist.count = data["count"]
+        hist.total = data["total"]
+        hist.min = data["min"] if data["min"] is not None else math.inf
+        hist.max = data["max"]
+        return hist
@@ -1,38 +1,207 @@
-from collections import deque
+import atexit
+import json
+import os
 import threading
-import numpy as np
+import time
+import uuid
 
-class DequeMetric:
-    """Thread-safe fixed-window percentile metric store."""
+from config import settings
+from utils.histogram import LatencyHistogram
 
-    def __init__(self, max_samples=5000):
-        self.values = deque(maxlen=max_samples)
+class HistogramMetric:
+    """Thread-safe value distribution: lifetime plus 1m/5m/1h windows.
+
+    Samples go into a mergeable LatencyHistogram (O(1) record, 1% relative
+    error) for the lifetime view and into time-sliced histograms for the
+    windows: 10s slices kept for 5 minutes and 1 minute slices kept for an
+    hour. A window merges the slices overlapping it, so it may reach up to
+    one slice further back than its nominal length.
+    """
+
+    # slice width (s) -> retention (s)
+    TIERS = {10: 300, 60: 3600}
+    # name -> (length (s), slice width (s))
+    WINDOWS = {"1m": (60, 10), "5m": (300, 10), "1h": (3600, 60)}
+
+    def __init__(self, unit="milliseconds", relative_error=0.01):
+        # Prometheus name suffix; "" for unitless values
+        self.unit = unit
+        self.relative_error = relative_error
         self.lock = threading.Lock()
+        self.reset()
+
+    def _histogram(self):
+        return LatencyHistogram(relative_error=self.relative_error)
 
-    def record(self, ms: float):
+    def record(self, value: float):
+        now = time.time()
         with self.lock:
-            self.values.append(ms)
+            self.lifetime.record(value)
+            for width, retention in self.TIERS.items():
+                slices = self.slices[width]
+                start = int(now // width) * width
+                hist = slices.get(start)
+                if hist is None:
+                    hist = slices[start] = self._histogram()
+                    # New slice: a good moment to drop the expired ones
+                    for old in [s for s in slices if s < now - retention - width]:
+                        del slices[old]
+                hist.record(value)
 
-    def stats(self):
+    def window(self, seconds: float, width: int) -> LatencyHistogram:
+        cutoff = time.time() - seconds
         with self.lock:
-            if len(self.values) == 0:
-                return {}
+            hists = [hist for start, hist in self.slices[width].items() if start + width > cutoff]
+        merged = self._histogram()
+        for hist in hists:
+            merged.merge(hist)
+        return merged
+
+    def stats(self):
+        stats = self.lifetime.summary()
+        if not stats:
+            return {}
+        stats["windows"] = {
+            name: self.window(seconds, width).summary()
+            for name, (seconds, width) in self.WINDOWS.items()
+        }
+        return stats
 
-            arr = np.array(self.values)
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
             return {
-                "count": len(arr),
-                "p50": float(np.percentile(arr, 50)),
-                "p95": float(np.percentile(arr, 95)),
-                "p99": float(np.percentile(arr, 99)),
+                "lifetime": self.lifetime.to_dict(),
+                # Expired slices are left out
+                "slices": {
+                    str(width): {
+                        str(start): hist.to_dict()
+                        for start, hist in slices.items() if start >= now - self.TIERS[width] - width
+                    }
+                    for width, slices in self.slices.items()
+                },
             }
 
+    def merge_snapshot(self, data):
+        with self.lock:
+            self.lifetime.merge(LatencyHistogram.from_dict(data["lifetime"]))
+            for width, slices in data["slices"].items():
+                mine = self.slices.setdefault(int(width), {})
+                for start, hist in slices.items():
+                    mine.setdefault(int(start), self._histogram()).merge(LatencyHistogram.from_dict(hist))
+
     def reset(self):
         with self.lock:
-            self.values.clear()
+            self.lifetime = self._histogram()
+            self.slices = {width: {} for width in self.TIERS}
+
+
+class CounterMetric:
+    """Thread-safe named event counters (cache hits, misses, ...)."""
+
+    def __init__(self, *names, label="event"):
+        self.names = names
+        # Prometheus label carrying the counter name
+        self.label = label
+        self.counts = dict.fromkeys(names, 0)
+        self.lock = threading.Lock()
+
+    def incr(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def snapshot(self):
+        return self.stats()
+
+    def merge_snapshot(self, data):
+        for name, amount in data.items():
+            self.incr(name, amount)
+
+    def reset(self):
+        with self.lock:
+            self.counts = dict.fromkeys(self.names, 0)
+
+
+def _create_metrics():
+    """Every pipeline metric, by name, in /metrics order."""
+    return {
+        "embedding": HistogramMetric(),
+        "embedding_cached": HistogramMetric(),
+        "retrieval": HistogramMetric(),
+        "rerank": HistogramMetric(),
+        "rerank_queue_wait": HistogramMetric(),
+        # requests per scoring call, not milliseconds
+        "rerank_batch_size": HistogramMetric(unit=""),
+        "llm": HistogramMetric(),
+        "ttft": HistogramMetric(),
+        "inter_token": HistogramMetric(),
+        "total": HistogramMetric(),
+        "index_batch": HistogramMetric(),
+        # chunks/sec per ingestion run, not milliseconds
+        "index_throughput": HistogramMetric(unit="chunks_per_second"),
+        # first docs/ event -> batch indexed
+        "watch_lag": HistogramMetric(),
+
+        "answer_cache": CounterMetric("exact_hit", "semantic_hit", "miss", "evicted"),
+        "embedding_cache": CounterMetric("hit", "spill_hit", "miss"),
+        "embedding_store": CounterMetric("hit", "miss"),
+        "watch": CounterMetric("events", "batches", "files", "errors", "retries", "dropped"),
+        "rerank_path": CounterMetric(
+            "reranked", "skipped_margin", "shrunk", "prefiltered", "budget_fallback", "timeout_fallback"
+        ),
+        # leader = executions started, waiter = requests that joined one in flight
+        "coalesce": CounterMetric("leader", "waiter"),
+        # LLM usage of freshly generated answers (cache hits cost nothing)
+        "tokens": CounterMetric("input", "output", "total", label="kind"),
+        # estimated prompt context tokens before / after packing
+        "context_tokens": CounterMetric("raw", "packed", label="kind"),
+        "context_pack": CounterMetric("merged", "overlap_stripped", "near_duplicate", "over_budget", "truncated"),
+        "errors": CounterMetric("query", "stream", "rerank", "job", "api", label="source"),
+    }
+
+
+# Merged snapshots of exited processes
+ARCHIVE_FILE = "metrics-archive.json"
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
 
 
 class Metrics:
-    """Global singleton metrics for the entire RAG pipeline."""
+    """Global singleton metrics for the entire RAG pipeline.
+
+    With METRICS_MULTIPROC_DIR set (several uvicorn workers), each server
+    process (see `start_flusher`) writes a snapshot of its metrics there
+    every METRICS_FLUSH_INTERVAL seconds and `stats()` / `prometheus()`
+    merge all snapshots, so any worker reports the whole service. Snapshots
+    of exited processes are folded into one archive file, so lifetime
+    totals survive restarts without the directory growing.
+    """
 
     _instance = None
     _lock = threading.Lock()
@@ -41,29 +210,214 @@ class Metrics:
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
-                    cls._instance = super().__new__(cls)
+                    instance = super().__new__(cls)
+                    instance.registry = _create_metrics()
+                    # metrics.embedding, metrics.answer_cache, ...
+                    for name, metric in instance.registry.items():
+                        setattr(instance, name, metric)
+
+                    instance.multiproc_dir = settings.METRICS_MULTIPROC_DIR
+                    instance.reset_at = time.time()
+                    # Set by start_flusher: this process shares its metrics
+                    instance.flushing = False
+                    # Tells this process's snapshots apart from an earlier one with the same pid
+                    instance.snapshot_id = uuid.uuid4().hex
 
-                    # Create metric buckets
-                    cls._instance.embedding = DequeMetric()
-                    cls._instance.retrieval = DequeMetric()
-                    cls._instance.rerank = DequeMetric()
-                    cls._instance.llm = DequeMetric()
-                    cls._instance.total = DequeMetric()
+                    cls._instance = instance
 
         return cls._instance
 
     def stats(self):
-        return {
-            "embedding": self.embedding.stats(),
-            "retrieval": self.retrieval.stats(),
-            "rerank": self.rerank.stats(),
-            "llm": self.llm.stats(),
-            "total": self.total.stats(),
-        }
+        registry = self._aggregate() if self.multiproc_dir else self.registry
+        return {name: metric.stats() for name, metric in registry.items()}
 
     def reset_all(self):
-        self.embedding.reset()
-        self.retrieval.reset()
-        self.rerank.reset()
-        self.llm.reset()
-        self.total.reset()
+        for metric in self.registry.values():
+            metric.reset()
+        self.reset_at = time.time()
+
+        if self.multiproc_dir:
+            # Other workers pick the marker up on their next flush
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            with open(self._reset_marker(), "w") as f:
+                f.write(str(self.reset_at))
+            if self.flushing:
+                self.flush()
+
+    # ---------------------------
+    # Multi-process aggregation
+    # ---------------------------
+    def _reset_marker(self):
+        return os.path.join(self.multiproc_dir, "reset")
+
+    def _last_reset(self):
+        try:
+            with open(self._reset_marker()) as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return 0.0
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.multiproc_dir, f"metrics-{pid}.json")
+
+    def flush(self):
+        """Write this process's snapshot (atomically) to the shared directory."""
+        last_reset = self._last_reset()
+        if last_reset > self.reset_at:
+            for metric in self.registry.values():
+                metric.reset()
+            self.reset_at = last_reset
+
+        _write_snapshot(self._snapshot_path(os.getpid()), {
+            "pid": os.getpid(),
+            "id": self.snapshot_id,
+            "reset_at": self.reset_at,
+            "metrics": {name: metric.snapshot() for name, metric in self.registry.items()},
+        })
+
+    def start_flusher(self):
+        """Share this process's metrics through METRICS_MULTIPROC_DIR (no-op
+        without it). Called by the API at startup only, so other processes
+        importing Metrics (spawned ingestion workers, scripts) never write
+        snapshots."""
+        if not self.multiproc_dir:
+            return
+        with self._lock:
+            if self.flushing:
+                return
+            self.flushing = True
+
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        # A snapshot left under this pid by an exited process would be overwritten
+        own = self._snapshot_path(os.getpid())
+        if os.path.exists(own):
+            self._archive([own])
+
+        def run():
+            while True:
+                time.sleep(settings.METRICS_FLUSH_INTERVAL)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=run, name="metrics-flusher", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _is_dead(self, path, data, now) -> bool:
+        """Snapshot of an exited process: not refreshed for a few flush
+        intervals (a live one never is) and its pid is gone."""
+        try:
+            stale = now - os.path.getmtime(path) > 3 * settings.METRICS_FLUSH_INTERVAL
+        except OSError:
+            return False
+        return stale and not _pid_alive(data["pid"])
+
+    def _archive(self, paths):
+        """Fold the given snapshots into the archive and delete them.
+        Serialized across processes by a lock file."""
+        import fcntl
+
+        with open(os.path.join(self.multiproc_dir, "archive.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            last_reset = self._last_reset()
+            archive_path = os.path.join(self.multiproc_dir, ARCHIVE_FILE)
+            archive = _read_snapshot(archive_path)
+            merged = _create_metrics()
+            if archive and archive["reset_at"] >= last_reset:
+                for name, snapshot in archive["metrics"].items():
+                    if name in merged:
+                        merged[name].merge_snapshot(snapshot)
+
+            archived = []
+            for path in paths:
+                data = _read_snapshot(path)
+                if data is None:
+                    # Already archived by another process
+                    continue
+                archived.append(data["id"])
+                if data["reset_at"] >= last_reset:
+                    for name, snapshot in data["metrics"].items():
+                        if name in merged:
+                            merged[name].merge_snapshot(snapshot)
+
+            if not archived:
+                return
+            _write_snapshot(archive_path, {
+                "pid": None,
+                # Readers skip these until they are deleted below
+                "archived": archived,
+                "reset_at": last_reset,
+                "metrics": {name: metric.snapshot() for name, metric in merged.items()},
+            })
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _aggregate(self):
+        """Merge every process's snapshot (and the archive) into a fresh registry."""
+        if self.flushing:
+            self.flush()
+        last_reset = self._last_reset()
+        merged = _create_metrics()
+        now = time.time()
+
+        # Read first, so snapshots it already holds are not counted twice
+        archive = _read_snapshot(os.path.join(self.multiproc_dir, ARCHIVE_FILE))
+        snapshots = [archive] if archive else []
+        archived = set(archive.get("archived", [])) if archive else set()
+        dead = []
+
+        for entry in os.scandir(self.multiproc_dir):
+            if entry.name == ARCHIVE_FILE or not (entry.name.startswith("metrics-") and entry.name.endswith(".json")):
+                continue
+            data = _read_snapshot(entry.path)
+            if data is None or data.get("id") in archived:
+                continue
+            snapshots.append(data)
+            if self._is_dead(entry.path, data, now):
+                dead.append(entry.path)
+
+        for data in snapshots:
+            # Workers that have not seen the latest reset yet would report stale totals
+            if data["reset_at"] < last_reset:
+                continue
+            for name, snapshot in data["metrics"].items():
+                if name in merged:
+                    merged[name].merge_snapshot(snapshot)
+
+        if dead:
+            try:
+                self._archive(dead)
+            except OSError:
+                pass
+        return merged
+
+    # ---------------------------
+    # Prometheus exposition
+    # ---------------------------
+    def prometheus(self):
+        """All metrics in the Prometheus text format. Distributions are
+        summaries: quantiles over the last 5 minutes, _sum/_count lifetime."""
+        registry = self._aggregate() if self.multiproc_dir else self.registry
+        lines = []
+
+        for name, metric in registry.items():
+            if isinstance(metric, HistogramMetric):
+                base = f"rag_{name}_{metric.unit}" if metric.unit else f"rag_{name}"
+                recent = metric.window(*HistogramMetric.WINDOWS["5m"])
+                lines.append(f"# TYPE {base} summary")
+                for q in (0.5, 0.9, 0.95, 0.99):
+                    value = recent.percentile(q * 100) if recent.count else "NaN"
+                    lines.append(f'{base}{{quantile="{q}"}} {value}')
+                lines.append(f"{base}_sum {metric.lifetime.total}")
+                lines.append(f"{base}_count {metric.lifetime.count}")
+            else:
+                base = f"rag_{name}_total"
+                lines.append(f"# TYPE {base} counter")
+                for event, count in metric.stats().items():
+                    lines.append(f'{base}{{{metric.label}="{event}"}} {count}')
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,60 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Trace of the request being served. Tasks and run_blocking copy the context,
+# so stages running on other tasks or worker threads report to the same trace.
+_current = contextvars.ContextVar("rag_trace", default=None)
+
+class Trace:
+    """Per-request stage timings in milliseconds. A stage hit more than once
+    (e.g. several embedding calls) accumulates."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage: str, ms: float):
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def timings(self):
+        """{stage: ms, ..., "total": ms since the trace started}."""
+        with self.lock:
+            timings = {stage: round(ms, 2) for stage, ms in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return timings
+
+    def server_timing(self):
+        """Value for the `Server-Timing` response header."""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.timings().items())
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+def record_stage(stage: str, ms: float, metric=None):
+    """Add `ms` to the current request's trace (if any) and to `metric`."""
+    if metric is not None:
+        metric.record(ms)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(stage, ms)
+
+
+@contextmanager
+def span(stage: str, metric=None):
+    """Time the block as `stage` of the current request (and into `metric`).
+    Nothing is recorded when the block raises."""
+    t0 = time.perf_counter()
+    yield
+    record_stage(stage, (time.perf_counter() - t0) * 1000, metric)
@@ -0,0 +1,121 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.hash_utils import HashUtils
+
+ChangedFile = namedtuple("ChangedFile", "filepath filename file_hash stat content_digest")
+TouchedFile = namedtuple("TouchedFile", "filename stat content_digest")
+# Hashes computed by whoever wrote the file (e.g. the upload endpoint), valid for that stat
+KnownDigest = namedtuple("KnownDigest", "stat file_hash content_digest")
+
+class ChangeDetector:
+    """Find new/changed files in the docs directory against the index manifest.
+
+    A file whose (size, mtime_ns, inode) matches the manifest snapshot is
+    unchanged without being read. Only the remaining candidates are hashed,
+    in a thread pool, reading each file once for both its BLAKE2b digest
+    (compared against the manifest) and its MD5 `file_hash` (kept in chunk
+    metadata, and used to verify rows written before BLAKE2b digests were
+    recorded).
+    """
+
+    def __init__(self, extensions, workers=8):
+        self.extensions = extensions
+        self.workers = workers
+
+    @staticmethod
+    def _stat_matches(indexed, stat) -> bool:
+        return (
+            indexed.get("mtime_ns") is not None
+            and indexed["size"] == stat.st_size
+            and indexed["mtime_ns"] == stat.st_mtime_ns
+            and indexed["inode"] == stat.st_ino
+        )
+
+    def _stat_files(self, data_path: str, filenames=None):
+        """Yield (path, filename, stat) for supported files, either the whole
+        directory or just `filenames` (missing ones are skipped)."""
+        if filenames is None:
+            with os.scandir(data_path) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith(self.extensions):
+                        yield entry.path, entry.name, entry.stat()
+            return
+
+        for filename in filenames:
+            path = os.path.join(data_path, filename)
+            if not filename.lower().endswith(self.extensions) or not os.path.isfile(path):
+                continue
+            yield path, filename, os.stat(path)
+
+    def scan(self, data_path: str, indexed_files, filenames=None, known=None):
+        """Return (changed, touched, on_disk).
+
+        `known` maps filename -> KnownDigest; a file whose stat still matches
+        its KnownDigest is classified from those hashes without being read.
+
+        changed:  ChangedFile list, sorted by filename, that must be re-indexed
+        touched:  TouchedFile list whose stat changed but content did not
+        on_disk:  set of supported filenames present in `data_path`
+                  (restricted to `filenames` when given)
+        """
+        on_disk = set()
+        candidates = []
+
+        changed, touched = [], []
+        known = known or {}
+
+        for path, filename, stat in self._stat_files(data_path, filenames):
+            on_disk.add(filename)
+            indexed = indexed_files.get(filename)
+            if indexed and self._stat_matches(indexed, stat):
+                continue
+
+            digest = known.get(filename)
+            if digest and self._same_stat(digest.stat, stat):
+                result = self._classify_known(path, filename, stat, indexed, digest)
+                (touched if isinstance(result, TouchedFile) else changed).append(result)
+                continue
+            candidates.append((path, filename, stat, indexed))
+
+        if candidates:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash") as pool:
+                for result in pool.map(self._classify, candidates):
+                    (touched if isinstance(result, TouchedFile) else changed).append(result)
+
+        changed.sort(key=lambda c: c.filename)
+        return changed, touched, on_disk
+
+    @staticmethod
+    def _same_stat(a, b) -> bool:
+        return (a.st_size, a.st_mtime_ns, a.st_ino) == (b.st_size, b.st_mtime_ns, b.st_ino)
+
+    @staticmethod
+    def _classify_known(filepath, filename, stat, indexed, known):
+        if indexed and (
+            indexed.get("content_digest") == known.content_digest
+            or (not indexed.get("content_digest") and indexed["file_hash"] == known.file_hash)
+        ):
+            return TouchedFile(filename, stat, known.content_digest)
+        return ChangedFile(filepath, filename, known.file_hash, stat, known.content_digest)
+
+    @staticmethod
+    def _classify(candidate):
+        filepath, filename, stat, indexed = candidate
+
+        # One read for both digests: a changed file needs the MD5 `file_hash` too,
+        # and which files changed is only known once the file has been read
+        file_hash, digest = HashUtils.md5_blake2b_file(filepath)
+        if indexed is None:
+            return ChangedFile(filepath, filename, file_hash, stat, digest)
+
+        if indexed.get("content_digest"):
+            if indexed["content_digest"] == digest:
+                return TouchedFile(filename, stat, digest)
+            return ChangedFile(filepath, filename, file_hash, stat, digest)
+
+        # Legacy manifest row (MD5 only)
+        if file_hash == indexed["file_hash"]:
+            return TouchedFile(filename, stat, digest)
+        return ChangedFile(filepath, filename, file_hash, stat, digest)
@@ -1,22 +1,31 @@
 import os
 from langchain_chroma import Chroma
 from .embeddings import EmbeddingsFactory
-from .loader import DocumentLoader
+from .ingestion import BatchIngestor
+from .processing import ParallelDocumentProcessor, process_file, assign_chunk_indices
+from .manifest import IndexManifest
+from .change_detector import ChangeDetector
 from utils.logger import get_logger
 from utils.hash_utils import HashUtils
-from preprocess.text_cleaner import clean_text
+from config import settings
+
+MANIFEST_FILENAME = "index_manifest.sqlite"
+DELETE_BATCH_SIZE = 500
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".docx")
 
 class ChromaManager:
     def __init__(self, data_path, chroma_path):
         self.data_path = data_path
         self.chroma_path = chroma_path
         self.db = None
+        self.embeddings = None
+        self.manifest = None
         self.logger = get_logger("chroma_manager")
-        # self.conflict_mode = "replace"
 
     def load_db(self):
         try:
             embeddings = EmbeddingsFactory.create()
+            self.embeddings = embeddings
 
             self.logger.info("Loading Chroma DB...")
             self.db = Chroma(
@@ -28,6 +37,12 @@ class ChromaManager:
             count = self.db._collection.count()
 
             self.logger.info(f"Chroma DB loaded with {count} chunks.")
+
+            self.manifest = IndexManifest(os.path.join(self.chroma_path, MANIFEST_FILENAME))
+            if self.manifest.is_empty() and count > 0:
+                # Index built before the manifest existed: scan its metadata once
+                files = self.manifest.bootstrap(self.db._collection)
+                self.logger.info(f"Built index manifest for {files} existing file(s).")
             
             return self.db
         except Exception as err:
@@ -38,86 +53,125 @@ class ChromaManager:
         self.db.delete(where={"filename": filename})
         self.logger.info(f"Deleted all chunks for file: {filename}")
     
+    def _delete_ids(self, ids):
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            self.db.delete(ids=ids[start:start + DELETE_BATCH_SIZE])
+        return len(ids)
+
+    def _indexed_chunk_ids(self, filename: str):
+        """Chunk ids currently stored for a file (manifest first, metadata lookup as fallback)."""
+        indexed = self.manifest.get(filename)
+        if indexed:
+            return indexed["chunk_ids"]
+        # No manifest row (e.g. crash before it was committed): ask Chroma directly
+        return self.db.get(where={"filename": filename}, include=[])["ids"]
+
     def generate_document_id(self, path: str) -> str:
         """Stable document_id based on file path."""
         return HashUtils.md5_text(path)
 
-    def update_index(self):
+    @staticmethod
+    def generate_chunk_id(chunk) -> str:
+        """Deterministic chunk id: document_id + chunk_index + content hash.
+
+        Re-indexing identical content yields identical ids, so upserts are
+        idempotent and a retried reindex never duplicates chunks.
+        """
+        content_hash = HashUtils.sha256_text(chunk.page_content)[:16]
+        return f"{chunk.metadata['document_id']}-{chunk.metadata['chunk_index']}-{content_hash}"
+
+    def _process_files(self, changed_files):
+        """Yield (filepath, filehash, chunks) for each changed file, in order."""
+        files = [(path, filehash, self.generate_document_id(path)) for path, filehash in changed_files]
+
+        if settings.INGEST_WORKERS > 0:
+            processor = ParallelDocumentProcessor(
+                workers=settings.INGEST_WORKERS,
+                pages_per_task=settings.INGEST_PDF_PAGES_PER_TASK,
+                nice=settings.INGEST_WORKER_NICE
+            )
+            yield from processor.process(files)
+            return
+
+        for filepath, filehash, document_id in files:
+            chunks = process_file(filepath, filehash, document_id)
+            yield filepath, filehash, assign_chunk_indices(chunks)
+
+    def update_index(self, progress=None, filenames=None, known=None):
+        """Index new/changed files. `progress(**fields)` receives status updates.
+        Returns (message, changed), `changed` being whether any chunk was
+        written to or deleted from Chroma.
+
+        `filenames` restricts the scan to those files of the docs directory
+        (e.g. the ones a watcher saw change); None scans the whole directory.
+        `known` ({filename: KnownDigest}) supplies hashes computed while the
+        files were written, so they are not read again.
+        Raises on failure so background jobs can report it.
+        """
+        progress = progress or (lambda **fields: None)
         try:
             self.logger.info("Updating Chroma DB...")
-            existing = self.db.get(include=["metadatas"])
-            existing_metas = existing["metadatas"]
-            self.logger.debug(f"Existing Metas: {existing_metas}")
-
-            existing_hashes = {m.get("file_hash") for m in existing_metas if m.get("file_hash")}
-            self.logger.debug(f"Existing Hashes: {existing_hashes}")
-            existing_filenames = {m.get("filename") for m in existing_metas if m.get("filename")}
-            self.logger.debug(f"Existing File Name: {existing_filenames}")
-
-            skip_filenames = []
-            filehashes = {}
+            # Stat columns only, and only for the files in scope: chunk ids are
+            # loaded per file below, for the files that changed or were removed
+            indexed_files = self.manifest.stat_entries(filenames)
+
+            # Stat-based: only files whose (size, mtime_ns, inode) moved are hashed
+            detector = ChangeDetector(SUPPORTED_EXTENSIONS, workers=settings.HASH_WORKERS)
+            changed, touched, on_disk = detector.scan(self.data_path, indexed_files, filenames, known)
+
+            for file in touched:
+                self.manifest.update_stat(file.filename, file.stat, file.content_digest)
+                self.logger.info(f"Skipping unchanged file: {file.filename}")
+
+            changed_files = [(file.filepath, file.file_hash) for file in changed]
+            scanned = {file.filepath: file for file in changed}
+
+            # Files removed from the docs directory: drop their chunks, then their manifest row
+            removed_files = sorted(set(indexed_files) - on_disk)
+            deleted = 0
+            for filename in removed_files:
+                deleted += self._delete_ids(self._indexed_chunk_ids(filename))
+                self.manifest.delete(filename)
+                self.logger.info(f"Removed {indexed_files[filename]['chunk_count']} chunks of deleted file: {filename}")
+
+            progress(
+                stage="indexing",
+                files_total=len(changed_files),
+                files_done=0,
+                files_removed=len(removed_files),
+                chunks_indexed=0
+            )
 
-            for filename in os.listdir(self.data_path):
-                filepath = os.path.join(self.data_path, filename)
+            if not changed_files:
+                self.logger.info("No new docs to index.")
+                if removed_files:
+                    return f"Removed {len(removed_files)} deleted file(s) from the index.", deleted > 0
+                return "No new docs to index.", False
 
-                if not filename.lower().endswith((".pdf", ".txt", ".docx")):
-                    continue
+            # Load, clean, split and embed one file at a time so peak memory
+            # is bounded by the largest file rather than the whole corpus
+            ingestor = BatchIngestor(self.db, self.embeddings)
+            written = 0
 
+            for files_done, (filepath, filehash, chunks) in enumerate(self._process_files(changed_files), start=1):
                 filename = os.path.basename(filepath)
-                filehash = HashUtils.md5_file(filepath)
-                filehashes[filename] = filehash
-
-                if filehash in existing_hashes:
-                    self.logger.info(f"Skipping unchanged file: {filename}")
-                    skip_filenames.append(filename)
-                    continue
-                
-                # # Conflict: same filename, different content
-                # if filename in existing_filenames:
-                #     if self.conflict_mode == "ignore":
-                #         self.logger.info(f"Ignored new version of file: {filename}")
-                #         skip_filenames.append(filename)
-                #         continue
-
-                #     if self.conflict_mode == "replace":
-                #         self.logger.info(f"Replacing existing file: {filename}")
-                #         self._delete_by_filename(filename)
-            
-            loader = DocumentLoader(self.data_path)
-            documents = loader.load_documents()
+                ids = [self.generate_chunk_id(chunk) for chunk in chunks]
 
-            new_docs = []
-            for doc in documents:
-                filepath = doc.metadata["source"]
-                filename = os.path.basename(filepath)
-                if filename in skip_filenames:
-                    continue
-                
-                # Clean + normalize text here
-                doc.page_content = clean_text(doc.page_content)
-                # Add metadata
-                doc.metadata["filename"] = filename
-                doc.metadata["file_hash"] = filehashes.get(filename)
-                doc.metadata["document_id"] = self.generate_document_id(filepath)
-
-                if "page" not in doc.metadata:
-                    doc.metadata["page"] = 0
-
-                new_docs.append(doc)
-            
-            if not new_docs:
-                self.logger.info("No new docs to index.")
-                return "No new docs to index."
-            
-            chunks = loader.split_documents(new_docs)
+                # Upsert the new version first so the file never disappears from
+                # search, then drop chunks that no longer exist in it
+                written += ingestor.ingest(chunks, ids)
+                stale_ids = set(self._indexed_chunk_ids(filename)) - set(ids)
+                deleted += self._delete_ids(sorted(stale_ids))
+
+                # Committed only after Chroma reflects the new version. The stat snapshot
+                # is the one taken at scan time, so an edit made mid-indexing is picked up next run
+                self.manifest.upsert(filename, filehash, scanned[filepath].stat, ids, scanned[filepath].content_digest)
+                self.logger.info(f"Indexed {len(chunks)} chunks from {filename} ({len(stale_ids)} stale removed)")
+                progress(files_done=files_done, chunks_indexed=written, current_file=filename)
 
-            for idx, chunk in enumerate(chunks):
-                chunk.metadata["chunk_index"] = idx
-                
-            self.db.add_documents(chunks)
-            self.logger.info(f"Indexed {len(chunks)} chunks.")
+            self.logger.info(f"Indexed {written} chunks.")
 
-            return "Sucessfully re-indexed the DB"
+            return "Sucessfully re-indexed the DB", written > 0 or deleted > 0
         except Exception as err:
             self.logger.error(f"Failed to re-index | Error ==> {err}")
-            return f"Failed to re-index | Error ==> {err}"
+            raise
@@ -0,0 +1,103 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.hash_utils import HashUtils
+from utils.performance_calc import Metrics
+
+metrics = Metrics()
+
+_WHITESPACE = re.compile(r"\s+")
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of query embeddings keyed on (model, normalized text).
+
+    Entries evicted from memory are optionally spilled to a SQLite file, so a
+    restart or a burst of distinct questions does not lose the warm set.
+    """
+
+    def __init__(self, max_entries=2048, spill_path=None, spill_max_entries=100_000):
+        self.max_entries = max_entries
+        self.spill_max_entries = spill_max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.spill = None
+        if spill_path:
+            os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+            self.spill = sqlite3.connect(spill_path, check_same_thread=False)
+            self.spill.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self.spill.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        normalized = _WHITESPACE.sub(" ", text).strip()
+        return HashUtils.sha256_text(f"{model}\x00{normalized}")
+
+    def get(self, model: str, text: str):
+        if self.max_entries <= 0:
+            return None
+
+        key = self.make_key(model, text)
+        with self.lock:
+            vec = self.entries.get(key)
+            if vec is not None:
+                self.entries.move_to_end(key)
+                metrics.embedding_cache.incr("hit")
+                return list(vec)
+
+            if self.spill is not None:
+                row = self.spill.execute(
+                    "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vec = np.frombuffer(row[0], dtype=np.float64).tolist()
+                    self._insert(key, vec)
+                    metrics.embedding_cache.incr("spill_hit")
+                    return list(vec)
+
+            metrics.embedding_cache.incr("miss")
+            return None
+
+    def put(self, model: str, text: str, vector):
+        if self.max_entries <= 0:
+            return
+
+        key = self.make_key(model, text)
+        with self.lock:
+            self._insert(key, list(vector))
+
+    def _insert(self, key, vec):
+        # Caller holds the lock
+        self.entries[key] = vec
+        self.entries.move_to_end(key)
+
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append(self.entries.popitem(last=False))
+
+        if evicted and self.spill is not None:
+            self.spill.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector) VALUES (?, ?)",
+                [(k, np.asarray(v, dtype=np.float64).tobytes()) for k, v in evicted]
+            )
+            # Keep the spill file bounded: drop the oldest rows beyond the cap
+            self.spill.execute(
+                "DELETE FROM query_embeddings WHERE rowid <= "
+                "(SELECT MAX(rowid) FROM query_embeddings) - ?",
+                (self.spill_max_entries,)
+            )
+            self.spill.commit()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.spill is not None:
+                self.spill.execute("DELETE FROM query_embeddings")
+                self.spill.commit()
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from utils.hash_utils import HashUtils
+
+class EmbeddingStore:
+    """Persistent content-addressed store: sha256(model + chunk text) -> vector.
+
+    Lives outside the Chroma directory, so re-embedding unchanged chunks (or
+    rebuilding the Chroma DB from scratch) is served locally instead of by the
+    embedding API.
+    """
+
+    # Stay well below SQLite's bound-parameter limit
+    _QUERY_BATCH = 500
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return HashUtils.sha256_text(f"{model}\x00{text}")
+
+    def get_many(self, model: str, texts):
+        """Return a list aligned with `texts`; missing vectors are None."""
+        keys = [self.make_key(model, t) for t in texts]
+        found = {}
+
+        with self.lock:
+            for start in range(0, len(keys), self._QUERY_BATCH):
+                batch = keys[start:start + self._QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+
+        return [
+            np.frombuffer(found[k], dtype=np.float32).tolist() if k in found else None
+            for k in keys
+        ]
+
+    def put_many(self, model: str, texts, vectors):
+        rows = [
+            (self.make_key(model, t), model, len(v), np.asarray(v, dtype=np.float32).tobytes())
+            for t, v in zip(texts, vectors)
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
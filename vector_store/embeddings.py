@@ -1,30 +1,95 @@
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from config import settings
 from utils.performance_calc import Metrics
+from utils.tracing import record_stage
+from .embedding_cache import QueryEmbeddingCache
+from .embedding_store import EmbeddingStore
+from .local_embeddings import HashingEmbeddings
 import time
 
 metrics = Metrics()
 
-class TimedGoogleEmbeddings(GoogleGenerativeAIEmbeddings):
-    """Measure embedding latency per query."""
+# Shared across embedding client instances so it survives re-initialization
+query_cache = QueryEmbeddingCache(
+    max_entries=settings.EMBEDDING_QUERY_CACHE_SIZE,
+    spill_path=settings.EMBEDDING_QUERY_CACHE_SPILL_PATH
+)
+
+# Chunk vectors already paid for, keyed by content
+document_store = EmbeddingStore(settings.EMBEDDING_STORE_PATH) if settings.EMBEDDING_STORE_PATH else None
+
+class TimedEmbeddingsMixin:
+    """Measure embedding latency and serve repeats from the query cache and
+    document store. Mixed in front of any LangChain `Embeddings` with a
+    `model` attribute."""
 
     def embed_query(self, text):
         t0 = time.time()
+        vec = query_cache.get(self.model, text)
+        if vec is not None:
+            # Cache hits are tracked separately so `embedding` keeps API latency only
+            record_stage("embedding_cached", (time.time() - t0) * 1000, metrics.embedding_cached)
+            return vec
+
         vec = super().embed_query(text)
         ms = (time.time() - t0) * 1000
 
-        metrics.embedding.record(ms)
+        record_stage("embedding", ms, metrics.embedding)
+        query_cache.put(self.model, text, vec)
         return vec
 
     def embed_documents(self, texts):
-        t0 = time.time()
-        vecs = super().embed_documents(texts)
-        ms = (time.time() - t0) * 1000
+        if document_store is None:
+            t0 = time.time()
+            vecs = super().embed_documents(texts)
+            ms = (time.time() - t0) * 1000
+
+            metrics.embedding.record(ms)
+            return vecs
+
+        vecs = document_store.get_many(self.model, texts)
+
+        # Only unique texts without a stored vector go to the API
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+        metrics.embedding_store.incr("hit", len(texts) - sum(v is None for v in vecs))
+        metrics.embedding_store.incr("miss", len(missing))
+
+        if missing:
+            t0 = time.time()
+            fresh = super().embed_documents(missing)
+            ms = (time.time() - t0) * 1000
+
+            metrics.embedding.record(ms)
+            document_store.put_many(self.model, missing, fresh)
+
+            by_text = dict(zip(missing, fresh))
+            vecs = [v if v is not None else by_text[t] for t, v in zip(texts, vecs)]
 
-        metrics.embedding.record(ms)
         return vecs
 
+class TimedGoogleEmbeddings(TimedEmbeddingsMixin, GoogleGenerativeAIEmbeddings):
+    """Gemini embeddings with timing and caching."""
+
+
+class TimedHashingEmbeddings(TimedEmbeddingsMixin, HashingEmbeddings):
+    """Offline hashing embeddings with timing and caching."""
+
+
+EMBEDDING_PROVIDERS = {
+    "google": lambda: TimedGoogleEmbeddings(model=settings.EMBEDDING_MODEL),
+    "hashing": lambda: TimedHashingEmbeddings(
+        dim=settings.LOCAL_EMBEDDING_DIM,
+        latency_ms=settings.LOCAL_EMBEDDING_LATENCY_MS
+    ),
+}
+
 class EmbeddingsFactory:
     @staticmethod
     def create():
-        return TimedGoogleEmbeddings(model=settings.EMBEDDING_MODEL)
+        provider = EMBEDDING_PROVIDERS.get(settings.EMBEDDING_PROVIDER)
+        if provider is None:
+            raise ValueError(
+                f"Unknown EMBEDDING_PROVIDER {settings.EMBEDDING_PROVIDER!r}, "
+                f"expected one of {sorted(EMBEDDING_PROVIDERS)}"
+            )
+        return provider()
@@ -0,0 +1,93 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import settings
+from utils.logger import get_logger
+from utils.performance_calc import Metrics
+from utils.rate_limiter import TokenBucket
+
+metrics = Metrics()
+
+logger = get_logger("ingestion")
+
+class BatchIngestor:
+    """Embed chunks in concurrent, rate-limited batches and write each batch
+    to Chroma as soon as it is embedded."""
+
+    def __init__(
+        self,
+        db,
+        embeddings,
+        batch_size=settings.EMBED_BATCH_SIZE,
+        concurrency=settings.EMBED_CONCURRENCY,
+        requests_per_minute=settings.EMBED_REQUESTS_PER_MINUTE,
+        max_retries=settings.EMBED_MAX_RETRIES,
+        backoff_seconds=settings.EMBED_RETRY_BACKOFF_SECONDS
+    ):
+        self.db = db
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.limiter = TokenBucket(rate=requests_per_minute / 60.0, capacity=concurrency)
+
+    def _embed_with_retry(self, texts):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                t0 = time.time()
+                vectors = self.embeddings.embed_documents(texts)
+                metrics.index_batch.record((time.time() - t0) * 1000)
+                return vectors
+            except Exception as err:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Embedding batch failed (attempt {attempt + 1}) | Retrying in {delay:.1f}s | Error ==> {err}")
+                time.sleep(delay)
+
+    def _write(self, batch, ids, vectors):
+        self.db._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[c.page_content for c in batch],
+            metadatas=[c.metadata for c in batch]
+        )
+
+    def ingest(self, chunks, ids) -> int:
+        """Embed and upsert `chunks` under `ids`. Returns the number of chunks written."""
+        if not chunks:
+            return 0
+
+        batches = [
+            (chunks[i:i + self.batch_size], ids[i:i + self.batch_size])
+            for i in range(0, len(chunks), self.batch_size)
+        ]
+
+        t0 = time.time()
+        written = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed-batch") as pool:
+            futures = {
+                pool.submit(self._embed_with_retry, [c.page_content for c in batch]): (batch, batch_ids)
+                for batch, batch_ids in batches
+            }
+            try:
+                for future in as_completed(futures):
+                    batch, batch_ids = futures[future]
+                    # Chroma writes stay on this thread; only embedding runs concurrently
+                    self._write(batch, batch_ids, future.result())
+                    written += len(batch)
+                    logger.info(f"Indexed {written}/{len(chunks)} chunks")
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        elapsed = time.time() - t0
+        if elapsed > 0:
+            metrics.index_throughput.record(written / elapsed)
+
+        return written
@@ -27,6 +27,13 @@ class DocumentLoader:
         )
         return loader.load()
 
+    def load_file(self, path: str):
+        """Lazily yield the Documents (e.g. PDF pages) of a single file."""
+        loader = smart_loader(path)
+        if loader is None:
+            raise ValueError(f"Unsupported file type: {path}")
+        yield from loader.lazy_load()
+
     def split_documents(self, docs):
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=500,
@@ -0,0 +1,55 @@
+import hashlib
+import re
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_TOKEN = re.compile(r"\w{3,}")  # 3+ chars: skips most stop words
+_BIGRAM_WEIGHT = 0.5
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic offline embedder (signed feature hashing).
+
+    Words (3+ chars) and, at half weight, word bigrams are hashed into `dim`
+    signed buckets and the vector is L2-normalized, i.e. a fixed random
+    projection of the bag-of-words. Texts that share words end up close, so
+    retrieval, reranking and caching behave plausibly without any network
+    access.
+    `latency_ms` adds a fixed delay per call to mimic a remote API.
+    """
+
+    def __init__(self, dim=1024, latency_ms=0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        # Cache/store key, so hashed vectors never mix with real ones
+        self.model = f"local-hashing-{dim}"
+
+    def _embed(self, text: str):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN.findall(text.lower())
+        features = [(token, 1.0) for token in tokens]
+        features += [(f"{a} {b}", _BIGRAM_WEIGHT) for a, b in zip(tokens, tokens[1:])]
+
+        for feature, weight in features:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self.dim] += weight if h >> 63 else -weight
+
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            # Empty text: any fixed unit vector keeps cosine distances defined
+            vec[0] = 1.0
+            norm = 1.0
+        return (vec / norm).tolist()
+
+    def _delay(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def embed_query(self, text: str):
+        self._delay()
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        self._delay()
+        return [self._embed(text) for text in texts]
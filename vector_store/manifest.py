@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class IndexManifest:
+    """Persistent filename -> (hash, stat snapshot, chunk ids) map kept next to the Chroma DB.
+
+    Change detection reads this instead of pulling every chunk's metadata out
+    of the collection, so it costs O(files) rather than O(chunks). A file's row
+    is committed right after its chunks are written to Chroma; if the process
+    dies in between, the stale row simply makes the file look changed and it
+    is re-indexed on the next run.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "filename TEXT PRIMARY KEY, "
+            "file_hash TEXT NOT NULL, "
+            "mtime REAL, "
+            "size INTEGER, "
+            "chunk_ids TEXT NOT NULL, "
+            "chunk_count INTEGER NOT NULL, "
+            "indexed_at REAL NOT NULL)"
+        )
+        # Stat snapshot + fast content digest used for change detection
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        for column, kind in (("mtime_ns", "INTEGER"), ("inode", "INTEGER"), ("content_digest", "TEXT")):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} {kind}")
+        self.conn.commit()
+
+    _COLUMNS = (
+        "filename, file_hash, mtime, size, chunk_ids, chunk_count, indexed_at, "
+        "mtime_ns, inode, content_digest"
+    )
+
+    @staticmethod
+    def _row_to_entry(row):
+        (filename, file_hash, mtime, size, chunk_ids, chunk_count, indexed_at,
+         mtime_ns, inode, content_digest) = row
+        return {
+            "filename": filename,
+            "file_hash": file_hash,
+            "mtime": mtime,
+            "size": size,
+            "chunk_ids": json.loads(chunk_ids),
+            "chunk_count": chunk_count,
+            "indexed_at": indexed_at,
+            "mtime_ns": mtime_ns,
+            "inode": inode,
+            "content_digest": content_digest,
+        }
+
+    def entries(self):
+        """Return {filename: entry} for every indexed file."""
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {self._COLUMNS} FROM files").fetchall()
+        return {row[0]: self._row_to_entry(row) for row in rows}
+
+    # Everything change detection needs; chunk_ids (O(chunks) to decode) is left out
+    _STAT_COLUMNS = "filename, file_hash, size, chunk_count, mtime_ns, inode, content_digest"
+    # Stay under SQLite's host parameter limit
+    _IN_BATCH = 500
+
+    def stat_entries(self, filenames=None):
+        """Return {filename: entry without chunk_ids} for every indexed file, or
+        only for `filenames`. Use `get` for a file's chunk ids."""
+        with self.lock:
+            if filenames is None:
+                rows = self.conn.execute(f"SELECT {self._STAT_COLUMNS} FROM files").fetchall()
+            else:
+                filenames = list(filenames)
+                rows = []
+                for start in range(0, len(filenames), self._IN_BATCH):
+                    batch = filenames[start:start + self._IN_BATCH]
+                    rows += self.conn.execute(
+                        f"SELECT {self._STAT_COLUMNS} FROM files "
+                        f"WHERE filename IN ({', '.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+
+        columns = [column.strip() for column in self._STAT_COLUMNS.split(",")]
+        return {row[0]: dict(zip(columns, row)) for row in rows}
+
+    def get(self, filename: str):
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM files WHERE filename = ?", (filename,)
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def upsert(self, filename: str, file_hash: str, stat, chunk_ids, content_digest=None):
+        """Record a file as indexed. `stat` is the os.stat_result taken when it was
+        hashed (None forces the next scan to re-hash the file)."""
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO files ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    filename, file_hash,
+                    stat.st_mtime if stat else None,
+                    stat.st_size if stat else None,
+                    json.dumps(chunk_ids), len(chunk_ids), time.time(),
+                    stat.st_mtime_ns if stat else None,
+                    stat.st_ino if stat else None,
+                    content_digest
+                )
+            )
+            self.conn.commit()
+
+    def update_stat(self, filename: str, stat, content_digest: str):
+        """Refresh the stat snapshot of a file whose content did not change (e.g. touched)."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE files SET mtime = ?, size = ?, mtime_ns = ?, inode = ?, content_digest = ? "
+                "WHERE filename = ?",
+                (stat.st_mtime, stat.st_size, stat.st_mtime_ns, stat.st_ino, content_digest, filename)
+            )
+            self.conn.commit()
+
+    def delete(self, filename: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+            self.conn.commit()
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+
+    def bootstrap(self, collection):
+        """One-time migration: build the manifest from an existing collection's metadata."""
+        existing = collection.get(include=["metadatas"])
+        files = {}
+        for chunk_id, meta in zip(existing["ids"], existing["metadatas"]):
+            filename = (meta or {}).get("filename")
+            if not filename:
+                continue
+            entry = files.setdefault(filename, {"file_hash": meta.get("file_hash", ""), "chunk_ids": []})
+            entry["chunk_ids"].append(chunk_id)
+
+        for filename, entry in files.items():
+            # No stat snapshot: the first scan re-hashes and compares against file_hash
+            self.upsert(filename, entry["file_hash"], None, entry["chunk_ids"])
+        return len(files)
@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+
+from .loader import DocumentLoader
+from preprocess.boilerplate import BoilerplateDetector
+from preprocess.text_cleaner import clean_text
+from config import settings
+
+def make_boilerplate_detector():
+    return BoilerplateDetector(
+        min_pages=settings.BOILERPLATE_MIN_PAGES,
+        page_ratio=settings.BOILERPLATE_PAGE_RATIO,
+        edge_lines=settings.BOILERPLATE_EDGE_LINES
+    )
+
+# ------------------------------
+# Worker-side functions (module level so they pickle into a process pool)
+# ------------------------------
+def prepare_pages(pages, filepath, filehash, document_id, boilerplate=None):
+    """Strip document-level boilerplate, clean page text and attach the index
+    metadata to each page Document."""
+    filename = os.path.basename(filepath)
+    detector = make_boilerplate_detector()
+    prepared = []
+    for doc in pages:
+        # Running headers/footers detected across the whole file
+        doc.page_content = detector.strip(doc.page_content, boilerplate)
+        # Clean + normalize text here
+        doc.page_content = clean_text(doc.page_content)
+        # Add metadata
+        doc.metadata["filename"] = filename
+        doc.metadata["file_hash"] = filehash
+        doc.metadata["document_id"] = document_id
+
+        if "page" not in doc.metadata:
+            doc.metadata["page"] = 0
+
+        prepared.append(doc)
+    return prepared
+
+def split_pages(pages, filepath, filehash, document_id, boilerplate=None):
+    """Clean + split already-extracted pages. Chunks come back without `chunk_index`."""
+    pages = prepare_pages(pages, filepath, filehash, document_id, boilerplate)
+    return DocumentLoader(os.path.dirname(filepath)).split_documents(pages)
+
+def process_file(filepath, filehash, document_id):
+    """Load, clean and split a whole file. Chunks come back without `chunk_index`."""
+    loader = DocumentLoader(os.path.dirname(filepath))
+    pages = list(loader.load_file(filepath))
+    boilerplate = make_boilerplate_detector().fit(doc.page_content for doc in pages)
+    return split_pages(pages, filepath, filehash, document_id, boilerplate)
+
+def extract_pdf_pages(filepath, start, end):
+    """Extract the raw text of pages [start, end) of a PDF.
+
+    Mirrors PyPDFLoader's page text and metadata (source, page, page_label,
+    total_pages and the document info: producer, creator, creationdate, ...)
+    so chunks match the single-process path.
+    """
+    from pypdf import PdfReader
+    # The normalization PyPDFParser applies to the document info
+    from langchain_community.document_loaders.parsers.pdf import _purge_metadata
+
+    reader = PdfReader(filepath)
+    doc_metadata = _purge_metadata(
+        {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+        | dict(reader.metadata or {})
+        | {"source": filepath, "total_pages": len(reader.pages)}
+    )
+    return [
+        Document(
+            page_content=reader.pages[i].extract_text(extraction_mode="plain").strip(),
+            metadata=doc_metadata | {"page": i, "page_label": reader.page_labels[i]}
+        )
+        for i in range(start, end)
+    ]
+
+def _init_worker(nice):
+    # Lower worker priority so reindexing does not starve the query path
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def assign_chunk_indices(chunks):
+    for idx, chunk in enumerate(chunks):
+        chunk.metadata["chunk_index"] = idx
+    return chunks
+
+
+class ParallelDocumentProcessor:
+    """Fan file parsing + cleaning out to a process pool.
+
+    Small files are one task each. PDFs with more than `pages_per_task` pages
+    run in two phases: page-range extraction tasks, then (once the parent has
+    fitted the boilerplate detector on all pages) page-range clean + split
+    tasks. Files are yielded in input order as (filepath, filehash, chunks),
+    with at most `max_inflight_files` files parsed ahead of the consumer to
+    keep parent memory bounded.
+    """
+
+    def __init__(self, workers, pages_per_task=50, nice=10, max_inflight_files=None):
+        self.workers = max(1, min(workers, (os.cpu_count() or 2) - 1))
+        self.pages_per_task = pages_per_task
+        self.nice = nice
+        self.max_inflight_files = max_inflight_files or self.workers * 2
+
+    def _submit(self, pool, filepath, filehash, document_id):
+        if filepath.lower().endswith(".pdf"):
+            from pypdf import PdfReader
+
+            total_pages = len(PdfReader(filepath).pages)
+            if total_pages > self.pages_per_task:
+                return True, [
+                    pool.submit(
+                        extract_pdf_pages, filepath, start,
+                        min(start + self.pages_per_task, total_pages)
+                    )
+                    for start in range(0, total_pages, self.pages_per_task)
+                ]
+        return False, [pool.submit(process_file, filepath, filehash, document_id)]
+
+    def process(self, files):
+        """`files` is an iterable of (filepath, filehash, document_id)."""
+        # Spawn, not fork: the API process runs many threads (executor pool, rerank
+        # batcher, onnxruntime, sqlite) and a forked child could inherit a held lock
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.nice,)
+        ) as pool:
+            window = deque()
+            for filepath, filehash, document_id in files:
+                window.append((filepath, filehash, document_id, *self._submit(pool, filepath, filehash, document_id)))
+                if len(window) >= self.max_inflight_files:
+                    yield self._collect(pool, *window.popleft())
+
+            while window:
+                yield self._collect(pool, *window.popleft())
+
+    def _collect(self, pool, filepath, filehash, document_id, split_pdf, futures):
+        chunks = []
+
+        if split_pdf:
+            # Range futures were submitted in page order
+            ranges = [future.result() for future in futures]
+            boilerplate = make_boilerplate_detector().fit(
+                doc.page_content for pages in ranges for doc in pages
+            )
+            futures = [
+                pool.submit(split_pages, pages, filepath, filehash, document_id, boilerplate)
+                for pages in ranges
+            ]
+
+        for future in futures:
+            chunks.extend(future.result())
+        return filepath, filehash, assign_chunk_indices(chunks)
@@ -0,0 +1,144 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.performance_calc import Metrics
+
+metrics = Metrics()
+logger = get_logger("rerank_scheduler")
+
+class _RerankRequest:
+    __slots__ = ("query", "texts", "future", "enqueued_at")
+
+    def __init__(self, query, texts):
+        self.query = query
+        self.texts = texts
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class RerankScheduler:
+    """Micro-batch cross-encoder reranking across concurrent requests.
+
+    Requests queue up for a dedicated worker thread. The worker takes the
+    first pending request, keeps collecting for up to `max_wait_ms` (or until
+    `max_batch_pairs` query-passage pairs are queued) and scores every pair
+    of the batch in one model invocation. Each request then gets back its
+    own ranking as a list of (passage index, score), best first.
+
+    FlashRank ONNX cross-encoders are batched through their tokenizer and
+    session directly. Any other model is ranked one request at a time via
+    its `rank(query, texts)` API, on the same worker thread.
+    """
+
+    def __init__(self, model, max_batch_pairs=128, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_pairs = max_batch_pairs
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+
+        ranker = getattr(model, "model", None)
+        self.onnx_ranker = ranker if (
+            getattr(ranker, "session", None) is not None
+            and getattr(ranker, "llm_model", None) is None
+        ) else None
+
+        self.worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self.worker.start()
+
+    # ------------------------------
+    # Public API
+    # ------------------------------
+    def submit(self, query: str, texts) -> Future:
+        request = _RerankRequest(query, list(texts))
+        self.queue.put(request)
+        return request.future
+
+    def rank(self, query: str, texts):
+        return self.submit(query, texts).result()
+
+    async def arank(self, query: str, texts):
+        return await asyncio.wrap_future(self.submit(query, texts))
+
+    # ------------------------------
+    # Worker
+    # ------------------------------
+    def _collect(self):
+        batch = [self.queue.get()]
+        pairs = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+
+        while pairs < self.max_batch_pairs:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            pairs += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            # Drop requests whose caller gave up (latency budget) while queued
+            batch = [request for request in self._collect() if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for request in batch:
+                metrics.rerank_queue_wait.record((started - request.enqueued_at) * 1000)
+            metrics.rerank_batch_size.record(len(batch))
+
+            try:
+                if self.onnx_ranker is not None:
+                    rankings = self._rank_onnx(batch)
+                else:
+                    rankings = [self._rank_single(request) for request in batch]
+            except Exception as err:
+                logger.error(f"Rerank batch of {len(batch)} failed | Error ==> {err}")
+                for request in batch:
+                    request.future.set_exception(err)
+                continue
+
+            for request, ranking in zip(batch, rankings):
+                request.future.set_result(ranking)
+
+    def _rank_single(self, request):
+        results = self.model.rank(request.query, request.texts)
+        return [(res.document.doc_id, res.score) for res in results.results]
+
+    def _rank_onnx(self, batch):
+        """Score all pairs of the batch at once (mirrors flashrank.Ranker.rerank)."""
+        ranker = self.onnx_ranker
+        pairs = [[request.query, text] for request in batch for text in request.texts]
+
+        encoded = ranker.tokenizer.encode_batch(pairs)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        token_type_ids = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+
+        onnx_input = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if np.any(token_type_ids):
+            onnx_input["token_type_ids"] = token_type_ids
+
+        logits = ranker.session.run(None, onnx_input)[0]
+        if logits.shape[1] == 1:
+            scores = 1 / (1 + np.exp(-logits.flatten()))
+        else:
+            exp_logits = np.exp(logits)
+            scores = exp_logits[:, 1] / np.sum(exp_logits, axis=1)
+
+        rankings = []
+        offset = 0
+        for request in batch:
+            request_scores = scores[offset:offset + len(request.texts)]
+            offset += len(request.texts)
+            order = np.argsort(-request_scores, kind="stable")
+            rankings.append([(int(i), float(request_scores[i])) for i in order])
+        return rankings
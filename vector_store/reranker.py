@@ -1,9 +1,15 @@
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 from rerankers import Reranker
-from langchain_core.runnables import RunnableLambda
 from utils.logger import get_logger
+from utils.executor import run_blocking
+from utils.tracing import record_stage
 
 from utils.performance_calc import Metrics
-import time
 
 from config import settings
 
@@ -11,38 +17,224 @@ metrics = Metrics()
 
 logger = get_logger("reranker")
 
+_TERM = re.compile(r"\w{3,}")
+
+def lexical_overlap(query_terms, text: str) -> float:
+    """Share of the query's terms (3+ chars) that occur in `text`."""
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(_TERM.findall(text.lower()))) / len(query_terms)
+
+
 class RerankerWrapper:
-    def __init__(self, retriever, top_n=settings.RERANKER_TOP_N):
+    """Vector search followed by a cascade of increasingly expensive steps.
+
+    1. If the best vector score beats the runner-up by `skip_margin`, the
+       vector order is kept and the cross-encoder is skipped.
+    2. Candidates scoring more than `shrink_margin` below the best are
+       dropped (keeping at least `min_candidates`).
+    3. If more than `prefilter_k` remain, only the vector top_n plus the
+       best lexical-overlap matches go to the cross-encoder.
+    4. With a deadline, the rerank is skipped when its estimated cost
+       (candidates x learned per-pair cost) does not fit, and abandoned when
+       it overruns; both fall back to vector order. Each skip moves the
+       estimate back toward RERANK_PAIR_COST_MS, so one slow batch cannot
+       keep every later request on the fallback path.
+
+    Every path taken is counted in `metrics.rerank_path`.
+    """
+
+    def __init__(self, retriever, top_n=settings.RERANKER_TOP_N, model=None, scheduler=None):
         self.retriever = retriever
         self.top_n = top_n
-        self.model = Reranker(settings.RERANKER_MODEL, model_type=settings.RERANKER_TYPE)
+        # Pass an already-loaded model to avoid reloading FlashRank on rebuilds
+        self.model = model or (scheduler.model if scheduler else self.load_model())
+        # Shared RerankScheduler: batches scoring across concurrent requests
+        self.scheduler = scheduler
+
+        self.cascade = settings.RERANK_CASCADE_ENABLED
+        self.skip_margin = settings.RERANK_SKIP_MARGIN
+        self.shrink_margin = settings.RERANK_SHRINK_MARGIN
+        self.min_candidates = settings.RERANK_MIN_CANDIDATES
+        self.prefilter_k = settings.RERANK_PREFILTER_K
+        # Running estimate of the cross-encoder cost per query-passage pair, shared
+        # by concurrent requests (event loop and worker threads), hence the lock
+        self.pair_cost_ms = settings.RERANK_PAIR_COST_MS
+        self.cost_lock = threading.Lock()
+
+    @staticmethod
+    def load_model():
+        return Reranker(settings.RERANKER_MODEL, model_type=settings.RERANKER_TYPE)
+
+    def _rank(self, query, texts, timeout=None):
+        """Return [(passage index, score)], best first."""
+        if self.scheduler:
+            future = self.scheduler.submit(query, texts)
+            try:
+                return future.result(timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise
+        results = self.model.rank(query, texts)
+        return [(res.document.doc_id, res.score) for res in results.results]
+
+    async def _arank(self, query, texts, timeout=None):
+        if self.scheduler:
+            ranking = self.scheduler.arank(query, texts)
+        else:
+            # Cross-encoder scoring is CPU-bound, keep it off the event loop
+            ranking = run_blocking(self._rank, query, texts)
+        return await asyncio.wait_for(ranking, timeout)
+
+    def _select_top(self, docs, ranking):
+        return [docs[doc_id] for doc_id, _ in ranking[:self.top_n]]
+
+    def _vector_order(self, scored):
+        return [doc for doc, _ in scored[:self.top_n]]
+
+    # ------------------------------
+    # Cascade
+    # ------------------------------
+    def _candidates(self, query, scored):
+        """Return the (Document, score) pairs worth reranking, or None when the
+        vector order is already decisive."""
+        if not self.cascade or len(scored) <= self.top_n:
+            return scored
+
+        best = scored[0][1]
+        if best - scored[1][1] >= self.skip_margin:
+            metrics.rerank_path.incr("skipped_margin")
+            return None
+
+        keep = max(self.top_n, self.min_candidates)
+        within = sum(1 for _, score in scored if best - score <= self.shrink_margin)
+        candidates = scored[:max(keep, within)]
+        if len(candidates) < len(scored):
+            metrics.rerank_path.incr("shrunk")
+
+        if self.prefilter_k and len(candidates) > self.prefilter_k:
+            terms = set(_TERM.findall(query.lower()))
+            overlap = [lexical_overlap(terms, doc.page_content) for doc, _ in candidates]
+            # Stable sort: equal overlap keeps vector order
+            by_overlap = sorted(range(len(candidates)), key=lambda i: -overlap[i])
+            chosen = set(range(self.top_n))
+            for i in by_overlap:
+                if len(chosen) >= self.prefilter_k:
+                    break
+                chosen.add(i)
+            candidates = [c for i, c in enumerate(candidates) if i in chosen]
+            metrics.rerank_path.incr("prefiltered")
+
+        return candidates
 
-    def rerank(self, query):
+    def _time_left(self, deadline, pairs):
+        """Seconds the rerank may take, None without a deadline, or 0 when the
+        estimated cost does not fit."""
+        if deadline is None:
+            return None
+        remaining = deadline - time.perf_counter()
+        with self.cost_lock:
+            if remaining * 1000 < pairs * self.pair_cost_ms:
+                # Nothing measures the cost while requests skip the rerank: decay
+                # toward the configured estimate so a later request probes it again
+                default = settings.RERANK_PAIR_COST_MS
+                if self.pair_cost_ms > default:
+                    self.pair_cost_ms = 0.8 * self.pair_cost_ms + 0.2 * default
+                return 0
+        return remaining
+
+    def _record(self, t0, pairs):
+        ms = (time.perf_counter() - t0) * 1000
+        record_stage("rerank", ms, metrics.rerank)
+        metrics.rerank_path.incr("reranked")
+        # Includes batching queue wait, which is what the budget has to absorb
+        with self.cost_lock:
+            self.pair_cost_ms = 0.8 * self.pair_cost_ms + 0.2 * (ms / pairs)
+
+    def _record_timeout(self, t0, timeout, pairs):
+        metrics.rerank_path.incr("timeout_fallback")
+        # The request still waited out the budget; only its trace sees that
+        record_stage("rerank", (time.perf_counter() - t0) * 1000)
+        # It took at least the whole budget: stop underestimating
+        with self.cost_lock:
+            self.pair_cost_ms = max(self.pair_cost_ms, timeout * 1000 / pairs)
+
+    def rerank(self, query, embedding=None, deadline=None):
         try:
-            docs = self.retriever.invoke(query)
-            if len(docs) == 0:
+            scored = self.retriever.invoke_with_scores(query, embedding)
+            if len(scored) == 0:
                 return []
-                
-            texts = [d.page_content for d in docs]
 
-            t0 = time.time()
-            ranked_results = self.model.rank(query, texts)
+            candidates = self._candidates(query, scored)
+            if candidates is None:
+                return self._vector_order(scored)
+
+            timeout = self._time_left(deadline, len(candidates))
+            if timeout == 0:
+                metrics.rerank_path.incr("budget_fallback")
+                return self._vector_order(scored)
+
+            docs = [doc for doc, _ in candidates]
+            t0 = time.perf_counter()
+            try:
+                ranking = self._rank(query, [d.page_content for d in docs], timeout)
+            except FutureTimeoutError:
+                self._record_timeout(t0, timeout, len(docs))
+                return self._vector_order(scored)
 
-            logger.info(f"Ranked results: {ranked_results}")
+            logger.info(f"Ranked results: {ranking}")
 
-            reranked_docs = []
-            for res in ranked_results.results[:self.top_n]:
-                original_doc = docs[res.document.doc_id]
-                reranked_docs.append(original_doc)
-            metrics.rerank.record((time.time() - t0) * 1000)
+            reranked_docs = self._select_top(docs, ranking)
+            self._record(t0, len(docs))
 
             return reranked_docs
         except Exception as err:
             logger.error(f"Failed to rerank | Error ==> {err}")
+            metrics.errors.incr("rerank")
+
+    async def arerank(self, query, embedding=None, deadline=None):
+        try:
+            scored = await self.retriever.ainvoke_with_scores(query, embedding)
+            if len(scored) == 0:
+                return []
+
+            candidates = self._candidates(query, scored)
+            if candidates is None:
+                return self._vector_order(scored)
+
+            timeout = self._time_left(deadline, len(candidates))
+            if timeout == 0:
+                metrics.rerank_path.incr("budget_fallback")
+                return self._vector_order(scored)
+
+            docs = [doc for doc, _ in candidates]
+            t0 = time.perf_counter()
+            try:
+                ranking = await self._arank(query, [d.page_content for d in docs], timeout)
+            except asyncio.TimeoutError:
+                self._record_timeout(t0, timeout, len(docs))
+                return self._vector_order(scored)
+
+            logger.info(f"Ranked results: {ranking}")
+
+            reranked_docs = self._select_top(docs, ranking)
+            self._record(t0, len(docs))
+
+            return reranked_docs
+        except Exception as err:
+            logger.error(f"Failed to rerank | Error ==> {err}")
+            metrics.errors.incr("rerank")
+
+    def invoke(self, query, embedding=None, deadline=None):
+        return self.rerank(query, embedding, deadline)
+
+    async def ainvoke(self, query, embedding=None, deadline=None):
+        return await self.arerank(query, embedding, deadline)
 
     def get_retriever(self):
-        # Return a Runnable retriever
-        return RunnableLambda(lambda q: self.rerank(q))
+        # Same invoke/ainvoke contract as FastChromaRetriever, so the chain
+        # can forward a precomputed query embedding and deadline
+        return self
 
 # class Reranker:
 #     def __init__(self, retriever, top_n=3):
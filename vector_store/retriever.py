@@ -1,14 +1,39 @@
+from utils.executor import run_blocking
+from utils.performance_calc import Metrics
+from utils.tracing import span
+
+metrics = Metrics()
+
 class FastChromaRetriever:
     def __init__(self, chroma_db, k=10):
         self.chroma = chroma_db
         self.k = k
+        self._relevance_fn = None
+
+    def invoke_with_scores(self, query, embedding=None):
+        """Return [(Document, relevance)], best first, relevance in [0, 1] (higher is better)."""
+        if embedding is None:
+            # Embed separately (timed as its own stage) so `retrieval` is search time only
+            embedding = self.chroma.embeddings.embed_query(query)
 
-    def invoke(self, query):
-        # MUCH faster than as_retriever()
-        results = self.chroma.similarity_search_with_relevance_scores(
-            query,
-            k=self.k
-        )
-        # results -> [(Document, score), ...]
+        # MUCH faster than as_retriever().
+        # The by-vector search returns raw distances; map them like the text search does
+        with span("retrieval", metrics.retrieval):
+            results = self.chroma.similarity_search_by_vector_with_relevance_scores(
+                embedding,
+                k=self.k
+            )
+        if self._relevance_fn is None:
+            self._relevance_fn = self.chroma._select_relevance_score_fn()
+        return [(doc, self._relevance_fn(distance)) for doc, distance in results]
+
+    def invoke(self, query, embedding=None, deadline=None):
         # For RAG you only need the Document
-        return [doc for doc, score in results]
+        return [doc for doc, score in self.invoke_with_scores(query, embedding)]
+
+    async def ainvoke_with_scores(self, query, embedding=None):
+        # Embedding + Chroma search are blocking, run them off the event loop
+        return await run_blocking(self.invoke_with_scores, query, embedding)
+
+    async def ainvoke(self, query, embedding=None, deadline=None):
+        return await run_blocking(self.invoke, query, embedding)
@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+
+from utils.logger import get_logger
+from utils.performance_calc import Metrics
+
+metrics = Metrics()
+logger = get_logger("docs_watcher")
+
+class DocsWatcher:
+    """Watch the docs directory and index changed files in coalesced batches.
+
+    Events come from watchdog (inotify/FSEvents/...) when it is installed and
+    `use_polling` is off, otherwise from a stat-snapshot poll of the directory.
+    Changed filenames collect in a backlog that is flushed once no new event
+    arrived for `debounce_seconds`, or once its oldest event is
+    `max_batch_delay` seconds old, so a burst of uploads becomes one batch.
+
+    `on_batch(filenames)` must block until the batch is indexed. Events seen
+    while a batch is indexing accumulate into the next one. When it raises,
+    the batch's files go back into the backlog and are retried after an
+    exponential backoff (`retry_backoff` doubling up to `max_retry_backoff`);
+    a file failing `max_retries` times in a row is logged and dropped until
+    its next event.
+    """
+
+    def __init__(self, data_path, extensions, on_batch, debounce_seconds=2.0,
+                 max_batch_delay=30.0, poll_interval=5.0, use_polling=False,
+                 max_retries=5, retry_backoff=5.0, max_retry_backoff=300.0):
+        self.data_path = os.path.abspath(data_path)
+        self.extensions = extensions
+        self.on_batch = on_batch
+        self.debounce_seconds = debounce_seconds
+        self.max_batch_delay = max_batch_delay
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        self.pending = {}  # filename -> monotonic time of its first event
+        self.failures = {}  # filename -> consecutive failed batches
+        self.retry_at = {}  # filename -> monotonic time before which it is not retried
+        self.last_event = 0.0
+        self.inflight = 0
+        self.cond = threading.Condition()
+        self.stopped = threading.Event()
+        self.observer = None
+        self.threads = []
+        self.mode = None
+
+    # ------------------------------
+    # Event sources
+    # ------------------------------
+    def _watches(self, path) -> bool:
+        return (
+            os.path.dirname(os.path.abspath(path)) == self.data_path
+            and path.lower().endswith(self.extensions)
+        )
+
+    def notify(self, filenames):
+        """Add changed filenames to the backlog."""
+        now = time.monotonic()
+        with self.cond:
+            for filename in filenames:
+                self.pending.setdefault(filename, now)
+                # The file changed again: the new version is worth trying right away
+                self.retry_at.pop(filename, None)
+            self.last_event = now
+            self.cond.notify()
+        metrics.watch.incr("events", len(filenames))
+
+    def _start_watchdog(self) -> bool:
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                paths = [event.src_path, getattr(event, "dest_path", "")]
+                names = [os.path.basename(p) for p in paths if p and watcher._watches(p)]
+                if names:
+                    watcher.notify(names)
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), self.data_path, recursive=False)
+        self.observer.start()
+        return True
+
+    def _snapshot(self):
+        snapshot = {}
+        with os.scandir(self.data_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(self.extensions):
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    def _poll_loop(self):
+        previous = self._snapshot()
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                current = self._snapshot()
+            except OSError as err:
+                logger.error(f"Failed to poll {self.data_path} | Error ==> {err}")
+                continue
+
+            changed = [
+                name for name in previous.keys() | current.keys()
+                if previous.get(name) != current.get(name)
+            ]
+            previous = current
+            if changed:
+                self.notify(changed)
+
+    # ------------------------------
+    # Batching
+    # ------------------------------
+    def _next_batch(self):
+        """Wait for a debounced batch. Returns (filenames, first_event) or None when stopped."""
+        with self.cond:
+            while not self.stopped.is_set():
+                if not self.pending:
+                    self.cond.wait()
+                    continue
+
+                now = time.monotonic()
+                ready = {
+                    name: first for name, first in self.pending.items()
+                    if self.retry_at.get(name, 0.0) <= now
+                }
+                if not ready:
+                    # Only files backing off after a failure
+                    self.cond.wait(min(self.retry_at[name] for name in self.pending) - now)
+                    continue
+
+                first_event = min(ready.values())
+                wait = min(
+                    self.last_event + self.debounce_seconds - now,
+                    first_event + self.max_batch_delay - now
+                )
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+
+                batch = sorted(ready)
+                for name in batch:
+                    del self.pending[name]
+                    self.retry_at.pop(name, None)
+                self.inflight = len(batch)
+                return batch, first_event
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            filenames, first_event = batch
+            logger.info(f"Indexing {len(filenames)} changed file(s): {filenames}")
+            try:
+                self.on_batch(filenames)
+                metrics.watch.incr("batches")
+                metrics.watch.incr("files", len(filenames))
+                # Freshness lag: first filesystem event -> batch searchable
+                metrics.watch_lag.record((time.monotonic() - first_event) * 1000)
+                with self.cond:
+                    for name in filenames:
+                        self.failures.pop(name, None)
+            except Exception as err:
+                metrics.watch.incr("errors")
+                logger.error(f"Watch batch failed | Error ==> {err}")
+                self._retry_later(filenames, first_event)
+            finally:
+                with self.cond:
+                    self.inflight = 0
+
+    def _retry_later(self, filenames, first_event):
+        """Put a failed batch back into the backlog with a capped exponential backoff."""
+        now = time.monotonic()
+        with self.cond:
+            for name in filenames:
+                failures = self.failures.get(name, 0) + 1
+                if failures > self.max_retries:
+                    self.failures.pop(name, None)
+                    metrics.watch.incr("dropped")
+                    logger.error(f"Giving up on {name} after {failures - 1} failed retries")
+                    continue
+
+                self.failures[name] = failures
+                metrics.watch.incr("retries")
+                if name in self.pending:
+                    # Changed again while indexing: the next batch takes the new version
+                    continue
+                backoff = min(self.retry_backoff * 2 ** (failures - 1), self.max_retry_backoff)
+                # Keep the original event time so watch_lag covers the retries
+                self.pending[name] = first_event
+                self.retry_at[name] = now + backoff
+            self.cond.notify()
+
+    # ------------------------------
+    # Lifecycle
+    # ------------------------------
+    def start(self):
+        if not self.use_polling and self._start_watchdog():
+            self.mode = "watchdog"
+        else:
+            self.mode = "polling"
+            self.threads.append(threading.Thread(target=self._poll_loop, name="docs-poll", daemon=True))
+
+        self.threads.append(threading.Thread(target=self._dispatch_loop, name="docs-watch", daemon=True))
+        for thread in self.threads:
+            thread.start()
+        logger.info(f"Watching {self.data_path} ({self.mode})")
+
+    def stop(self):
+        self.stopped.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+
+    def status(self):
+        """Backlog snapshot: pending files, age of the oldest event, batch being indexed."""
+        with self.cond:
+            oldest = min(self.pending.values()) if self.pending else None
+            return {
+                "mode": self.mode,
+                "backlog_files": len(self.pending),
+                "backlog_age_seconds": time.monotonic() - oldest if oldest is not None else 0.0,
+                "inflight_files": self.inflight,
+                "retrying_files": sum(1 for name in self.pending if name in self.retry_at),
+            }